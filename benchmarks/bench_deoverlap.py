@@ -0,0 +1,210 @@
+"""Benchmark deoverlap_all against the previous O(n^2) predecessor scan.
+
+Runs without Nuke: benchmarks/fake_nuke.py is installed as `nuke` before
+labelmaker_deoverlap is imported. Synthetic layouts are columns of nodes with
+some horizontal jitter, so nodes overlap both their column neighbours and,
+occasionally, nodes in adjacent columns.
+
+Usage:
+    python benchmarks/bench_deoverlap.py [--sizes 1000,10000,50000]
+                                         [--reference-limit 10000]
+
+The reference implementation is quadratic, so it is only run (and its result
+compared against the new sweep) for sizes up to --reference-limit.
+
+With --groups N, each size is instead split across N Group nodes and laid out
+with deoverlap_all(recursive=True), and every Group's result is checked against the reference.
+
+With --incremental, each layout is settled once, then --edits random nodes
+are moved or grown and the script is laid out again, by a full sweep and by
+deoverlap_all(incremental=True); the two results are compared.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import fake_nuke  # noqa: E402
+
+
+def make_layout(node_count, seed=0):
+    """Columns of 80x(18-58) nodes, tightly stacked so many need pushing."""
+    rng = random.Random(seed)
+    column_count = max(1, int(node_count ** 0.5))
+    nodes = []
+    for index in range(node_count):
+        column = index % column_count
+        row = index // column_count
+        x = column * 110 + rng.randint(-40, 40)
+        y = row * 30 + rng.randint(-10, 10)
+        height = rng.choice((18, 18, 18, 30, 42, 58))
+        nodes.append(fake_nuke.Node("Grade", "Node{}".format(index), xpos=x, ypos=y, height=height))
+    return nodes
+
+
+def reference_deoverlap(nodes, minimum_gap):
+    """The pre-skyline sweep, kept verbatim as the ground truth."""
+    position_cache = {}
+    for node in nodes:
+        x = node.xpos()
+        y = node.ypos()
+        position_cache[node.name()] = [x, y, x + node.screenWidth(), y + node.screenHeight()]
+    sorted_nodes = sorted(
+        nodes, key=lambda node: (position_cache[node.name()][1], node.name())
+    )
+    for node_index, node in enumerate(sorted_nodes):
+        node_bbox = position_cache[node.name()]
+        max_predecessor_bottom = None
+        for predecessor in sorted_nodes[:node_index]:
+            predecessor_bbox = position_cache[predecessor.name()]
+            if node_bbox[2] > predecessor_bbox[0] and node_bbox[0] < predecessor_bbox[2]:
+                if max_predecessor_bottom is None or predecessor_bbox[3] > max_predecessor_bottom:
+                    max_predecessor_bottom = predecessor_bbox[3]
+        if max_predecessor_bottom is None:
+            continue
+        required_top = max_predecessor_bottom + minimum_gap
+        if required_top > node_bbox[1]:
+            push_amount = required_top - node_bbox[1]
+            node_bbox[1] += push_amount
+            node_bbox[3] += push_amount
+    return {name: int(bbox[1]) for name, bbox in position_cache.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--reference-limit", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--groups", type=int, default=0)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--edits", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    fake_nuke.install()
+    sys.path.insert(0, REPO_DIR)
+    import labelmaker_deoverlap
+
+    if args.groups:
+        return run_groups(labelmaker_deoverlap, args)
+    if args.incremental:
+        return run_incremental(labelmaker_deoverlap, args)
+
+    print("{:>8} {:>12} {:>12} {:>9}  {}".format("nodes", "skyline s", "reference s", "speedup", "result"))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        fake_nuke.reset()
+        for node in make_layout(size, args.seed):
+            fake_nuke.add_node(node)
+        start = time.perf_counter()
+        labelmaker_deoverlap.deoverlap_all()
+        skyline_seconds = time.perf_counter() - start
+
+        if size > args.reference_limit:
+            print("{:>8} {:>12.3f} {:>12} {:>9}  {}".format(size, skyline_seconds, "-", "-", "not checked"))
+            continue
+
+        reference_nodes = make_layout(size, args.seed)
+        start = time.perf_counter()
+        expected = reference_deoverlap(reference_nodes, labelmaker_deoverlap.MINIMUM_GAP)
+        reference_seconds = time.perf_counter() - start
+        actual = {node.name(): node.ypos() for node in fake_nuke.allNodes()}
+        print("{:>8} {:>12.3f} {:>12.3f} {:>8.1f}x  {}".format(
+            size,
+            skyline_seconds,
+            reference_seconds,
+            reference_seconds / skyline_seconds,
+            "identical" if actual == expected else "MISMATCH",
+        ))
+        if actual != expected:
+            return 1
+    return 0
+
+
+def build_groups(size, group_count, seed):
+    """group_count Group nodes at the top level, each holding size // group_count nodes."""
+    fake_nuke.reset()
+    groups = []
+    for group_index in range(group_count):
+        group = fake_nuke.add_node(
+            fake_nuke.Node("Group", "Group{}".format(group_index), xpos=group_index * 110)
+        )
+        for node in make_layout(size // group_count, seed + group_index):
+            fake_nuke.add_node(node, group)
+        groups.append(group)
+    return groups
+
+
+def run_groups(labelmaker_deoverlap, args):
+    print("{:>8} {:>7} {:>12}  {}".format("nodes", "groups", "seconds", "result"))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        groups = build_groups(size, args.groups, args.seed)
+        start = time.perf_counter()
+        report = labelmaker_deoverlap.deoverlap_all(recursive=True)
+        seconds = time.perf_counter() - start
+        result = "{} contexts".format(len(report["contexts"]))
+        if size // args.groups <= args.reference_limit:
+            for group_index, group in enumerate(groups):
+                expected = reference_deoverlap(
+                    make_layout(size // args.groups, args.seed + group_index),
+                    labelmaker_deoverlap.MINIMUM_GAP,
+                )
+                actual = {node.name(): node.ypos() for node in fake_nuke.allNodes(group=group)}
+                if actual != expected:
+                    print("MISMATCH in {}".format(group.name()))
+                    return 1
+            result += ", identical"
+        print("{:>8} {:>7} {:>12.3f}  {}".format(size, args.groups, seconds, result))
+    return 0
+
+
+def run_incremental(labelmaker_deoverlap, args):
+    print("{:>8} {:>6} {:>9} {:>9} {:>13} {:>9}  {}".format(
+        "nodes", "edits", "swept", "full s", "incremental s", "speedup", "result"
+    ))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        fake_nuke.reset()
+        for node in make_layout(size, args.seed):
+            fake_nuke.add_node(node)
+        labelmaker_deoverlap._layout_indexes.clear()
+        labelmaker_deoverlap.deoverlap_all(incremental=True)  # settle and index
+
+        rng = random.Random(args.seed)
+        nodes = fake_nuke.allNodes()
+        for node in rng.sample(nodes, min(args.edits, len(nodes))):
+            if rng.random() < 0.5:
+                node.setYpos(node.ypos() + rng.randint(-200, 200))
+            else:
+                node._height += 24  # a label grew
+        edited = {node.name(): node.ypos() for node in nodes}
+
+        start = time.perf_counter()
+        labelmaker_deoverlap.deoverlap_all()
+        full_seconds = time.perf_counter() - start
+        expected = {node.name(): node.ypos() for node in nodes}
+
+        for node in nodes:
+            node.setYpos(edited[node.name()])
+        start = time.perf_counter()
+        report = labelmaker_deoverlap.deoverlap_all(incremental=True)
+        incremental_seconds = time.perf_counter() - start
+        actual = {node.name(): node.ypos() for node in nodes}
+        print("{:>8} {:>6} {:>9} {:>9.3f} {:>13.3f} {:>8.1f}x  {}".format(
+            size,
+            args.edits,
+            report["swept"],
+            full_seconds,
+            incremental_seconds,
+            full_seconds / incremental_seconds,
+            "identical" if actual == expected else "MISMATCH",
+        ))
+        if actual != expected:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,633 @@
+"""A stand-in `nuke` module, so Labelmaker can be exercised without a Nuke license.
+
+Only the parts of the Nuke Python API that Labelmaker touches are emulated,
+and only closely enough to drive the same code paths:
+
+- nodes with knobs, DAG positions and input connections
+- thisNode() context for nuke.value/numvalue/knob/expression
+- nuke.tcl("subst", ...) for [value knob] substitutions; anything else raises
+  RuntimeError like a failing TCL command would
+- allNodes/toNode/dependent, Undo, frame, toolbar menus and callback registration
+- Group contexts: add_node(node, group) puts node inside a "Group" node, and
+  allNodes(group=..., recurseGroups=...) filters accordingly
+
+Call install() before importing any Labelmaker module. The module also counts
+calls that would cross into Nuke (knob reads, setYpos, tcl...), in
+`call_counts`, which is useful for spotting chatty code.
+"""
+import collections
+import re
+import sys
+
+NUKE_VERSION_STRING = "15.0v1"
+NUKE_VERSION_MAJOR = 15
+INPUTS = 4
+HIDDEN_INPUTS = 8
+EXPRESSIONS = 1
+
+call_counts = collections.Counter()
+warnings = []
+callbacks = collections.defaultdict(list)
+autolabels = []
+
+_script = {"nodes": [], "by_name": {}, "this": None, "frame": 1, "knob": None}
+_class_templates = {}  # {node_class: function(node) adding default knobs}
+
+
+class Knob(object):
+    """A knob holding a plain value, or one animated linearly over frames."""
+
+    def __init__(self, name, value, knob_class="Double_Knob", animated=False):
+        self._name = name
+        self._value = value
+        self._class = knob_class
+        self._animated = animated
+
+    def name(self):
+        return self._name
+
+    def Class(self):
+        return self._class
+
+    def value(self):
+        call_counts["knob.value"] += 1
+        if not self._animated:
+            return self._value
+        offset = (_script["frame"] - 1) * 0.01
+        if isinstance(self._value, list):
+            return [component + offset for component in self._value]
+        return self._value + offset
+
+    getValue = value
+
+    def setValue(self, value):
+        call_counts["knob.setValue"] += 1
+        self._value = value
+
+    def isAnimated(self):
+        return self._animated
+
+    def setAnimated(self, animated=True):
+        self._animated = animated
+
+    def hasExpression(self):
+        return False
+
+    def evaluate(self):
+        """The value with TCL substituted in the context of the knob's node."""
+        return tcl("in", self._node.fullName(), "subst {" + str(self._value) + "}")
+
+    def toScript(self):
+        call_counts["knob.toScript"] += 1
+        if self._animated:
+            return "{{curve x1 {}}}".format(self._value)
+        return _format_tcl(self._value)
+
+
+def _format_tcl(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return "{:g}".format(value)
+    if isinstance(value, (list, tuple)):
+        return "{{{}}}".format(" ".join(_format_tcl(item) for item in value))
+    return str(value)
+
+
+class Node(object):
+    def __init__(self, node_class, name, knobs=(), xpos=0, ypos=0, width=80, height=18):
+        self._class = node_class
+        self._knobs = collections.OrderedDict()
+        self._inputs = []
+        self._x = xpos
+        self._y = ypos
+        self._width = width
+        self._height = height
+        self._deleted = False
+        self._group = None  # the Group node this node lives in, None for the top level
+        for knob in (
+            Knob("name", name, "String_Knob"),
+            Knob("label", "", "Multiline_Eval_String_Knob"),
+            Knob("note_font", "Verdana", "Font_Knob"),
+            Knob("indicators", 0, "Int_Knob"),
+        ):
+            self.addKnob(knob)
+        template = _class_templates.get(node_class)
+        if template is not None:
+            template(self)
+        for knob in knobs:
+            self.addKnob(knob)
+
+    def addKnob(self, knob):
+        knob._node = self
+        self._knobs[knob.name()] = knob
+
+    def Class(self):
+        return self._class
+
+    def name(self):
+        call_counts["node.name"] += 1
+        return self._knobs["name"].value()
+
+    def fullName(self):
+        if self._group is None:
+            return self.name()
+        return "{}.{}".format(self._group.fullName(), self.name())
+
+    def setName(self, name):
+        _script["by_name"].pop(self.fullName(), None)
+        self._knobs["name"].setValue(name)
+        _script["by_name"][self.fullName()] = self
+
+    def knob(self, name):
+        call_counts["node.knob"] += 1
+        return self._knobs.get(name)
+
+    def knobs(self):
+        call_counts["node.knobs"] += 1
+        return dict(self._knobs)
+
+    def __getitem__(self, name):
+        call_counts["node.__getitem__"] += 1
+        try:
+            return self._knobs[name]
+        except KeyError:
+            raise NameError("knob {} does not exist".format(name))
+
+    def xpos(self):
+        call_counts["node.xpos"] += 1
+        return self._x
+
+    def ypos(self):
+        call_counts["node.ypos"] += 1
+        return self._y
+
+    def setXpos(self, x):
+        call_counts["node.setXpos"] += 1
+        self._x = int(x)
+
+    def setYpos(self, y):
+        call_counts["node.setYpos"] += 1
+        self._y = int(y)
+
+    def screenWidth(self):
+        call_counts["node.screenWidth"] += 1
+        return self._width
+
+    def screenHeight(self):
+        call_counts["node.screenHeight"] += 1
+        return self._height
+
+    def minInputs(self):
+        return 2 if "maskChannelMask" in self._knobs else 1
+
+    def maxInputs(self):
+        return 2
+
+    def optionalInput(self):
+        return 1
+
+    def inputs(self):
+        return len(self._inputs)
+
+    def input(self, index):
+        if 0 <= index < len(self._inputs):
+            return self._inputs[index]
+        return None
+
+    def setInput(self, index, node):
+        while len(self._inputs) <= index:
+            self._inputs.append(None)
+        self._inputs[index] = node
+        while self._inputs and self._inputs[-1] is None:
+            self._inputs.pop()
+        return True
+
+    def dependent(self, what=INPUTS, forceEvaluate=True):
+        call_counts["node.dependent"] += 1
+        return [node for node in _script["nodes"] if self in node._inputs]
+
+    def clones(self):
+        return 0
+
+    def redraw(self):
+        call_counts["node.redraw"] += 1
+        label_this(self)
+
+    def __repr__(self):
+        return "<fake {} {}>".format(self._class, self._knobs["name"]._value)
+
+
+class Group(Node):
+    """A Group node. Nodes are put inside one with add_node(node, group)."""
+
+    def begin(self):
+        return self
+
+    def end(self):
+        pass
+
+
+class Menu(object):
+    def __init__(self, name, items=()):
+        self._name = name
+        self._items = list(items)
+
+    def name(self):
+        return self._name
+
+    def items(self):
+        return list(self._items)
+
+    def findItem(self, name):
+        for item in self._items:
+            if item.name() == name:
+                return item
+        return None
+
+    def addCommand(self, name, command=None, shortcut=None, icon=None, index=-1):
+        item = MenuItem(name, command)
+        self._items.append(item)
+        return item
+
+    def addMenu(self, name, **kwargs):
+        menu = Menu(name)
+        self._items.append(menu)
+        return menu
+
+
+class MenuItem(object):
+    def __init__(self, name, script):
+        self._name = name
+        self._script = script
+
+    def name(self):
+        return self._name
+
+    def script(self):
+        return self._script
+
+
+_menus = {"Nodes": Menu("Nodes"), "Nuke": Menu("Nuke", [Menu("Edit")])}
+
+
+class Undo(object):
+    disabled_depth = 0
+    groups = []
+
+    @classmethod
+    def disable(cls):
+        cls.disabled_depth += 1
+
+    @classmethod
+    def enable(cls):
+        cls.disabled_depth -= 1
+
+    @classmethod
+    def begin(cls, name=None):
+        cls.groups.append(name)
+
+    @classmethod
+    def end(cls):
+        pass
+
+    @classmethod
+    def cancel(cls):
+        pass
+
+
+class _ThisKnob(object):
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+
+# --- script management helpers (not part of the real API) ---
+
+def reset():
+    """Empty the script and forget call counts."""
+    _script["nodes"] = []
+    _script["by_name"] = {}
+    _script["this"] = None
+    _script["frame"] = 1
+    call_counts.clear()
+
+
+def add_node(node, group=None):
+    """Add node to the script, inside the Group node group if given."""
+    node._group = group
+    _script["nodes"].append(node)
+    _script["by_name"][node.fullName()] = node
+    return node
+
+
+def _inside(node, group):
+    parent = node._group
+    while parent is not None:
+        if parent is group:
+            return True
+        parent = parent._group
+    return False
+
+
+def register_class(node_class, template):
+    """template(node) adds the default knobs of node_class to a new node."""
+    _class_templates[node_class] = template
+
+
+def set_this_node(node):
+    _script["this"] = node
+
+
+def set_frame(frame_number):
+    _script["frame"] = frame_number
+
+
+def set_toolbar(menu):
+    _menus["Nodes"] = menu
+
+
+def label_this(node):
+    """Run the registered autolabel callbacks with node as thisNode()."""
+    previous = _script["this"]
+    _script["this"] = node
+    try:
+        return [callback() for callback in autolabels]
+    finally:
+        _script["this"] = previous
+
+
+# --- emulated API ---
+
+def thisNode():
+    return _script["this"]
+
+
+def thisKnob():
+    return _script["knob"] or _ThisKnob("")
+
+
+def thisGroup():
+    return None
+
+
+def root():
+    return Node("Root", "fake_script.nk")
+
+
+def frame(frame_number=None):
+    if frame_number is not None:
+        _script["frame"] = frame_number
+    return _script["frame"]
+
+
+def allNodes(filter=None, group=None, recurseGroups=False):
+    call_counts["allNodes"] += 1
+    return [
+        node for node in _script["nodes"]
+        if (filter is None or node.Class() == filter)
+        and (node._group is group or (recurseGroups and (group is None or _inside(node, group))))
+    ]
+
+
+def toNode(name):
+    call_counts["toNode"] += 1
+    return _script["by_name"].get(name)
+
+
+def createNode(node_class, knobs="", inpanel=True):
+    node_number = 1
+    while "{}{}".format(node_class, node_number) in _script["by_name"]:
+        node_number += 1
+    node_type = Group if node_class == "Group" else Node
+    return add_node(node_type(node_class, "{}{}".format(node_class, node_number)))
+
+
+def delete(node):
+    _script["nodes"].remove(node)
+    _script["by_name"].pop(node.fullName(), None)
+    node._deleted = True
+
+
+class _NodesNamespace(object):
+    def __getattr__(self, node_class):
+        return lambda **kwargs: createNode(node_class, inpanel=False)
+
+
+nodes = _NodesNamespace()
+
+
+def _resolve(path):
+    """Return (node, knob name) for "this.knob", "knob", "input.knob", "Node.knob" or "Group.Node.knob"."""
+    node = _script["this"]
+    parts = path.split(".")
+    names = parts[:-1]
+    index = 0
+    while index < len(names):
+        part = names[index]
+        if part == "this":
+            index += 1
+            continue
+        if part == "input" or part.startswith("input") and part[5:].isdigit():
+            node = node.input(int(part[5:] or 0)) if node is not None else None
+            index += 1
+        else:
+            # the longest full name starting here
+            for end in range(len(names), index, -1):
+                node = _script["by_name"].get(".".join(names[index:end]))
+                if node is not None:
+                    index = end
+                    break
+        if node is None:
+            return None, parts[-1]
+    return node, parts[-1]
+
+
+_MISSING = object()
+
+
+def value(path, default=_MISSING):
+    call_counts["value"] += 1
+    node, knob_name = _resolve(path)
+    knob = node._knobs.get(knob_name) if node is not None else None
+    if knob is None:
+        if default is _MISSING:
+            raise NameError("unknown knob {}".format(path))
+        return default
+    result = knob.value()
+    if isinstance(result, (list, tuple, bool, float)):
+        return _format_tcl(result)
+    return str(result)
+
+
+def numvalue(path, default=_MISSING):
+    call_counts["numvalue"] += 1
+    node, knob_name = _resolve(path)
+    knob = node._knobs.get(knob_name) if node is not None else None
+    if knob is None:
+        if default is _MISSING:
+            raise NameError("unknown knob {}".format(path))
+        return default
+    result = knob.value()
+    if isinstance(result, (list, tuple)):
+        result = result[0]
+    try:
+        return float(result)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def knob(path, new_value=None):
+    call_counts["knob"] += 1
+    node, knob_name = _resolve(path)
+    found = node._knobs.get(knob_name) if node is not None else None
+    if found is None:
+        raise NameError("unknown knob {}".format(path))
+    if new_value is not None:
+        found.setValue(new_value)
+    return _format_tcl(found.value())
+
+
+def expression(text):
+    call_counts["expression"] += 1
+    node = _script["this"]
+    if "keys?" in text and node is not None:
+        indicators = 0
+        if any(knob.isAnimated() for knob in node._knobs.values()):
+            indicators += 1
+        return float(indicators)
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+
+_VALUE_COMMAND = re.compile(r"\[value\s+([^\s\]]+)\s*\]")
+
+
+_BACKSLASH_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+_BACKSLASH_CHARACTERS = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+def _parse_word(word):
+    """The text of a single TCL word, braced or backslash-escaped."""
+    if word.startswith("{") and word.endswith("}"):
+        return word[1:-1]
+    return _BACKSLASH_ESCAPE.sub(
+        lambda match: _BACKSLASH_CHARACTERS.get(match.group(1), match.group(1)), word
+    )
+
+
+def tcl(command, *args):
+    if command == "in":
+        # in node {subst ...}: only subst is emulated
+        node = _script["by_name"].get(args[0])
+        script_command, _, word = args[1].partition(" ")
+        if node is None or script_command != "subst":
+            raise RuntimeError("unsupported TCL in fake nuke: in {}".format(" ".join(args)))
+        this = _script["this"]
+        _script["this"] = node
+        try:
+            return tcl("subst", _parse_word(word))
+        finally:
+            _script["this"] = this
+    call_counts["tcl"] += 1
+    if command != "subst":
+        raise RuntimeError("invalid command name \"{}\"".format(command))
+    text = args[0]
+
+    def substitute(match):
+        try:
+            return value(match.group(1))
+        except NameError as error:
+            raise RuntimeError(str(error))
+
+    substituted = _VALUE_COMMAND.sub(substitute, text)
+    if "[" in substituted or "$" in substituted:
+        # anything beyond [value ...] is not emulated; fail like bad TCL would
+        raise RuntimeError("unsupported TCL in fake nuke: {}".format(text))
+    return substituted
+
+
+def toolbar(name):
+    return _menus[name]
+
+
+def menu(name):
+    return _menus[name]
+
+
+def pluginPath():
+    return []
+
+
+def center():
+    return [0.0, 0.0]
+
+
+def zoom(*args):
+    return 1.0
+
+
+def _record_callback(kind):
+    def register(function, *args, **kwargs):
+        callbacks[kind].append(function)
+
+    def unregister(function, *args, **kwargs):
+        if function in callbacks[kind]:
+            callbacks[kind].remove(function)
+
+    return register, unregister
+
+
+addOnCreate, removeOnCreate = _record_callback("onCreate")
+addOnDestroy, removeOnDestroy = _record_callback("onDestroy")
+addKnobChanged, removeKnobChanged = _record_callback("knobChanged")
+addOnScriptLoad, removeOnScriptLoad = _record_callback("onScriptLoad")
+addOnScriptClose, removeOnScriptClose = _record_callback("onScriptClose")
+addOnScriptSave, removeOnScriptSave = _record_callback("onScriptSave")
+
+
+def addAutolabel(function, *args, **kwargs):
+    autolabels.append(function)
+
+
+def removeAutolabel(function, *args, **kwargs):
+    if function in autolabels:
+        autolabels.remove(function)
+
+
+def warning(message):
+    warnings.append(message)
+
+
+def debug(message):
+    pass
+
+
+def message(text):
+    warnings.append(text)
+
+
+def tprint(*args):
+    pass
+
+
+def getFilename(*args, **kwargs):
+    return None
+
+
+def executeInMainThread(function, args=(), kwargs=None):
+    return function(*args, **(kwargs or {}))
+
+
+def executeInMainThreadWithResult(function, args=(), kwargs=None):
+    return function(*args, **(kwargs or {}))
+
+
+def install():
+    """Make `import nuke` return this module."""
+    sys.modules["nuke"] = sys.modules[__name__]
+    return sys.modules[__name__]
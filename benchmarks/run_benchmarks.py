@@ -0,0 +1,219 @@
+"""Offline throughput and memory benchmarks for Labelmaker.
+
+Installs benchmarks/fake_nuke.py as `nuke`, builds synthetic scripts with
+benchmarks/synthetic.py and times the hot paths:
+
+    autolabel_cold    create_autolabel on every node after a config reload
+    autolabel_warm    create_autolabel on every node again (label cache hits)
+    autolabel_frames  create_autolabel on every node over 10 frames
+    deoverlap_all     one full deoverlap sweep
+    deoverlap_chain   downstream deoverlap from every Read at once
+
+Usage:
+    python benchmarks/run_benchmarks.py [--nodes 1000,5000] [--repeat 3]
+        [--save results.json] [--baseline results.json] [--tolerance 1.5]
+
+With --baseline, exits non-zero if any benchmark's throughput falls below
+baseline / tolerance, so it can gate CI on plain Linux.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+
+def _prepare_environment():
+    """Install the fake nuke and point prefs/config lookups at a scratch home."""
+    home = tempfile.mkdtemp(prefix="labelmaker_bench_")
+    os.makedirs(os.path.join(home, ".nuke"))
+    os.environ["HOME"] = home
+    os.environ["USERPROFILE"] = home
+    sys.path.insert(0, BENCHMARKS_DIR)
+    sys.path.insert(0, REPO_DIR)
+    import fake_nuke
+    fake_nuke.install()
+    import synthetic
+    fake_nuke.set_toolbar(synthetic.toolbar_for())
+    return fake_nuke, synthetic
+
+
+def _label_all(fake_nuke, autolabeller, nodes):
+    for node in nodes:
+        fake_nuke.set_this_node(node)
+        autolabeller.create_autolabel()
+
+
+def _bench_autolabel_cold(context):
+    fake_nuke, autolabeller, nodes = context["nuke"], context["autolabeller"], context["nodes"]
+    autolabeller.config = context["config"]  # drops compiled plans and cached labels
+    _label_all(fake_nuke, autolabeller, nodes)
+    return len(nodes)
+
+
+def _bench_autolabel_warm(context):
+    fake_nuke, autolabeller, nodes = context["nuke"], context["autolabeller"], context["nodes"]
+    _label_all(fake_nuke, autolabeller, nodes)
+    return len(nodes)
+
+
+def _bench_autolabel_frames(context):
+    fake_nuke, autolabeller, nodes = context["nuke"], context["autolabeller"], context["nodes"]
+    for frame_number in range(1, 11):
+        fake_nuke.set_frame(frame_number)
+        _label_all(fake_nuke, autolabeller, nodes)
+    fake_nuke.set_frame(1)
+    return len(nodes) * 10
+
+
+def _bench_deoverlap_all(context):
+    context["deoverlap"].deoverlap_all()
+    return len(context["nodes"])
+
+
+def _bench_deoverlap_chain(context):
+    deoverlap = context["deoverlap"]
+    deoverlap.invalidate_dependency_graph()
+    sources = [node.name() for node in context["nodes"] if node.Class() == "Read"]
+    deoverlap.deoverlap_downstream_many(sources)
+    return len(context["nodes"])
+
+
+def _no_setup(context):
+    pass
+
+
+def _fresh_layout(context):
+    context["rebuild"]()
+
+
+# (name, untimed setup run before every repeat, timed benchmark)
+BENCHMARKS = (
+    ("autolabel_cold", _no_setup, _bench_autolabel_cold),
+    ("autolabel_warm", _no_setup, _bench_autolabel_warm),
+    ("autolabel_frames", _no_setup, _bench_autolabel_frames),
+    ("deoverlap_all", _fresh_layout, _bench_deoverlap_all),
+    ("deoverlap_chain", _fresh_layout, _bench_deoverlap_chain),
+)
+
+
+def run(node_counts, repeat, seed):
+    fake_nuke, synthetic = _prepare_environment()
+    import labelmaker
+    import labelmaker_config
+    import labelmaker_deoverlap
+    import labelmaker_prefs
+
+    # no Qt here, and growth-triggered deoverlap is benchmarked separately
+    labelmaker_prefs.prefs_singleton.set("deoverlap_enabled", False)
+
+    results = []
+    for node_count in node_counts:
+        context = {
+            "nuke": fake_nuke,
+            "autolabeller": labelmaker.autolabeller_singleton,
+            "config": labelmaker_config.composed_config_singleton,
+            "deoverlap": labelmaker_deoverlap,
+        }
+
+        def rebuild(node_count=node_count):
+            context["nodes"] = synthetic.build_script(node_count, seed=seed)
+
+        context["rebuild"] = rebuild
+        rebuild()
+        for name, setup, benchmark in BENCHMARKS:
+            timings = []
+            for _ in range(repeat):
+                setup(context)
+                start = time.perf_counter()
+                items = benchmark(context)
+                timings.append(time.perf_counter() - start)
+            setup(context)
+            tracemalloc.start()
+            benchmark(context)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            best = min(timings)
+            results.append({
+                "benchmark": name,
+                "nodes": node_count,
+                "items": items,
+                "best_seconds": best,
+                "items_per_second": items / best if best else float("inf"),
+                "peak_kib": peak_bytes / 1024.0,
+            })
+        results.append({
+            "benchmark": "label_cache",
+            "nodes": node_count,
+            "stats": labelmaker.autolabeller_singleton.label_cache.stats(),
+        })
+    return results
+
+
+def _print_results(results):
+    print("{:<18} {:>8} {:>10} {:>12} {:>14} {:>10}".format(
+        "benchmark", "nodes", "items", "best s", "items/s", "peak KiB"
+    ))
+    for result in results:
+        if "stats" in result:
+            print("{:<18} {:>8} {}".format(result["benchmark"], result["nodes"], result["stats"]))
+            continue
+        print("{:<18} {:>8} {:>10} {:>12.4f} {:>14.0f} {:>10.0f}".format(
+            result["benchmark"],
+            result["nodes"],
+            result["items"],
+            result["best_seconds"],
+            result["items_per_second"],
+            result["peak_kib"],
+        ))
+
+
+def _regressions(results, baseline, tolerance):
+    expected = {
+        (result["benchmark"], result["nodes"]): result["items_per_second"]
+        for result in baseline
+        if "items_per_second" in result
+    }
+    failures = []
+    for result in results:
+        key = (result["benchmark"], result["nodes"])
+        if key in expected and result["items_per_second"] * tolerance < expected[key]:
+            failures.append("{} @ {} nodes: {:.0f} items/s vs baseline {:.0f}".format(
+                key[0], key[1], result["items_per_second"], expected[key]
+            ))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", default="1000,5000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    results = run([int(count) for count in args.nodes.split(",")], args.repeat, args.seed)
+    _print_results(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        failures = _regressions(results, baseline, args.tolerance)
+        for failure in failures:
+            print("REGRESSION: {}".format(failure))
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
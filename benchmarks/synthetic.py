@@ -0,0 +1,212 @@
+"""Synthetic Nuke scripts for the fake nuke module.
+
+build_script() lays out a comp-like script: a number of Read branches, each
+running through a stack of Grades/Transforms/OFX effects, merged together in
+a chain down the middle. Knob values are randomised so that a realistic share
+of knobs sit off their defaults, some knobs are animated, and some Reads have
+very long paths.
+"""
+import random
+
+import fake_nuke as nuke
+
+OFX_CLASSES = (
+    "OFXuk.co.thefoundry.furnace.f_denoise_v2",
+    "OFXcom.borisfx.sapphire.s_glow_v1",
+    "OFXcom.genarts.sapphire.stylize.s_blur_v1",
+)
+
+# class name: weight within a branch
+BRANCH_CLASSES = (
+    ("Grade", 5),
+    ("Transform", 3),
+    ("Blur", 2),
+    ("Shuffle", 1),
+    ("OFX", 1),
+)
+
+
+def _knobs(node, specs):
+    for name, value, knob_class in specs:
+        node.addKnob(nuke.Knob(name, value, knob_class))
+
+
+def _masked(node):
+    _knobs(node, (
+        ("maskChannelMask", "none", "Channel_Knob"),
+        ("maskChannelInput", "none", "Channel_Knob"),
+        ("invert_mask", False, "Boolean_Knob"),
+        ("unpremult", "none", "Channel_Knob"),
+        ("mix", 1.0, "Double_Knob"),
+    ))
+
+
+def _grade(node):
+    _knobs(node, (
+        ("channels", "rgb", "ChannelMask_Knob"),
+        ("blackpoint", 0.0, "AColor_Knob"),
+        ("whitepoint", 1.0, "AColor_Knob"),
+        ("black", 0.0, "AColor_Knob"),
+        ("white", 1.0, "AColor_Knob"),
+        ("multiply", 1.0, "AColor_Knob"),
+        ("add", 0.0, "AColor_Knob"),
+        ("gamma", 1.0, "AColor_Knob"),
+    ))
+    _masked(node)
+
+
+def _transform(node):
+    _knobs(node, (
+        ("translate", [0.0, 0.0], "XY_Knob"),
+        ("rotate", 0.0, "Double_Knob"),
+        ("scale", 1.0, "WH_Knob"),
+        ("skewX", 0.0, "Double_Knob"),
+        ("skewY", 0.0, "Double_Knob"),
+        ("motionblur", 0.0, "Double_Knob"),
+        ("shutter", 0.5, "Double_Knob"),
+    ))
+
+
+def _blur(node):
+    _knobs(node, (
+        ("channels", "rgba", "ChannelMask_Knob"),
+        ("size", 0.0, "WH_Knob"),
+    ))
+    _masked(node)
+
+
+def _shuffle(node):
+    _knobs(node, (
+        ("in", "rgba", "Channel_Knob"),
+        ("out", "rgba", "Channel_Knob"),
+    ))
+
+
+def _merge(node):
+    _knobs(node, (
+        ("operation", "over", "Enumeration_Knob"),
+        ("Achannels", "rgba", "ChannelMask_Knob"),
+        ("Bchannels", "rgba", "ChannelMask_Knob"),
+        ("output", "rgba", "ChannelMask_Knob"),
+        ("also_merge", "none", "ChannelMask_Knob"),
+    ))
+    _masked(node)
+
+
+def _read(node):
+    _knobs(node, (
+        ("file", "", "File_Knob"),
+        ("colorspace", "default", "Enumeration_Knob"),
+        ("raw", False, "Boolean_Knob"),
+        ("first", 1001, "Int_Knob"),
+        ("last", 1100, "Int_Knob"),
+    ))
+
+
+def _ofx(node):
+    _knobs(node, (("amount", 1.0, "Double_Knob"),))
+
+
+for _node_class, _template in (
+    ("Grade", _grade),
+    ("Transform", _transform),
+    ("Blur", _blur),
+    ("Shuffle", _shuffle),
+    ("Merge2", _merge),
+    ("Read", _read),
+) + tuple((ofx_class, _ofx) for ofx_class in OFX_CLASSES):
+    nuke.register_class(_node_class, _template)
+
+
+def toolbar_for(ofx_classes=OFX_CLASSES, filler_items=2000):
+    """A Nodes toolbar with the OFX classes buried among many ordinary entries."""
+    submenus = []
+    for menu_index in range(max(1, filler_items // 100)):
+        items = [
+            nuke.MenuItem(
+                "Tool{}_{}".format(menu_index, item_index),
+                "nuke.createNode('Tool{}_{}')".format(menu_index, item_index),
+            )
+            for item_index in range(100)
+        ]
+        submenus.append(nuke.Menu("Category{}".format(menu_index), items))
+    plugins = [
+        nuke.MenuItem(
+            ofx_class.split(".")[-1].rsplit("_", 1)[0].upper(),
+            "nuke.createNode('{}')".format(ofx_class),
+        )
+        for ofx_class in ofx_classes
+    ]
+    submenus.append(nuke.Menu("Plugins", [nuke.Menu("OFX", plugins)]))
+    return nuke.Menu("Nodes", submenus)
+
+
+def _randomise(node, rng, animated_fraction):
+    for knob in list(node._knobs.values()):
+        if knob.name() in ("name", "label", "note_font", "indicators"):
+            continue
+        current = knob._value
+        if isinstance(current, bool) or isinstance(current, str):
+            continue
+        if rng.random() < 0.35:
+            if isinstance(current, list):
+                knob.setValue([round(rng.uniform(-2.0, 4.0), 3) for _ in current])
+            elif knob.Class() in ("AColor_Knob", "Color_Knob") and rng.random() < 0.5:
+                knob.setValue([round(rng.uniform(0.0, 4.0), 3) for _ in range(4)])
+            else:
+                knob.setValue(type(current)(round(rng.uniform(0.0, 4.0), 3)))
+        if rng.random() < animated_fraction:
+            knob.setAnimated()
+
+
+def build_script(node_count, seed=0, branch_length=12, animated_fraction=0.02):
+    """Reset the fake script and fill it with about node_count connected nodes.
+
+    Returns the list of nodes. Each branch is a column; merges run down a
+    column of their own to the right of the branch they consume.
+    """
+    nuke.reset()
+    rng = random.Random(seed)
+    classes = [node_class for node_class, weight in BRANCH_CLASSES for _ in range(weight)]
+    counters = {}
+    created = []
+
+    def make(node_class, x, y):
+        counters[node_class] = counters.get(node_class, 0) + 1
+        base = node_class.rstrip("0123456789") if not node_class.startswith("OFX") else "OFX"
+        node = nuke.Node(node_class, "{}{}".format(base, counters[node_class]), xpos=x, ypos=y)
+        nuke.add_node(node)
+        created.append(node)
+        return node
+
+    merge = None
+    branch_index = 0
+    while len(created) < node_count:
+        x = branch_index * 220
+        y = 0
+        read = make("Read", x, y)
+        depth = rng.randint(2, 4)
+        read["file"].setValue("/mnt/projects/show/seq{:03d}/shot{:04d}/{}/plates/{}".format(
+            branch_index % 40,
+            branch_index * 10,
+            "/".join("sub{}".format(level) for level in range(depth)),
+            "plate_v{:03d}.####.exr".format(rng.randint(1, 40)),
+        ))
+        upstream = read
+        for step in range(min(branch_length, node_count - len(created))):
+            node_class = rng.choice(classes)
+            if node_class == "OFX":
+                node_class = rng.choice(OFX_CLASSES)
+            y += rng.choice((24, 30, 36))
+            node = make(node_class, x + rng.randint(-6, 6), y)
+            _randomise(node, rng, animated_fraction)
+            node.setInput(0, upstream)
+            upstream = node
+        if len(created) < node_count:
+            merge_node = make("Merge2", x + 110, y + 40)
+            _randomise(merge_node, rng, animated_fraction)
+            merge_node.setInput(0, merge if merge is not None else upstream)
+            merge_node.setInput(1, upstream)
+            merge = merge_node
+        branch_index += 1
+    return created
@@ -1,10 +1,38 @@
 import nuke
 import os
-import re
 import json
+import time
 import labelmaker_config
 import labelmaker_prefs
 import labelmaker_deoverlap
+import labelmaker_plan
+import labelmaker_cache
+import labelmaker_profiling
+import labelmaker_ofx
+import labelmaker_tcl
+import labelmaker_relabel
+import labelmaker_playback
+import labelmaker_color
+import labelmaker_state
+
+# Knobs read by the fixed (non-config) parts of the autolabel. Together with
+# the knobs named in the class's plan, these make up the label fingerprint.
+FINGERPRINT_KNOBS = (
+    "label",
+    "file",
+    "channels",
+    "maskChannelInput",
+    "maskChannelMask",
+    "invert_mask",
+    "unpremult",
+    "alpha",
+    "output",
+    "operation",
+    "mix",
+    "note_font",
+)
+# String knobs whose value may be TCL-substituted before display
+TCL_STRING_KNOBS = ("label", "file")
 
 
 # from https://gist.github.com/anonymous/a802f51391163a2bf0e3
@@ -75,6 +103,14 @@ def node_mask_input_plugged(n):
 class AutolabelReplacement(object):
     def __init__(self, config):
         super(AutolabelReplacement, self).__init__()
+        self._plans = {}  # {node_true_class: LabelPlan or None} compiled lazily from self.config
+        self._labelled_plans = {}  # {node_true_class: LabelPlan or None} last plan actually used, survives invalidation
+        self.label_cache = labelmaker_cache.LabelCache()
+        self.label_snippets = labelmaker_tcl.SnippetCache()
+        self.profiler = labelmaker_profiling.profiler_singleton
+        self.stats = labelmaker_profiling.stats_singleton  # collects while self.profiler is enabled
+        self.tcl_evaluations = 0  # running count of interpreter calls, for per-entry stats
+        self.playback_throttle = labelmaker_playback.PlaybackThrottle()
         self.config = config
         self.class_mappings = {
             "Merge2": "Merge",
@@ -84,11 +120,78 @@ class AutolabelReplacement(object):
             "DeepColorCorrect2": "DeepColorCorrect",
             "CheckerBoard2": "CheckerBoard",
         }
-        self.update_class_mappings_with_ofx_nodes()
+        # OFX classes are resolved on first sight, see resolve_node_class
+        self.ofx_mappings = labelmaker_ofx.OfxClassMappings()
         self.NAMELESS_NODES = ("Dot", "BackdropNode", "PostageStamp", "StickyNote")
-        self._line_counts = {}       # {node_name: int} last known line count per node
-        self._pending_deoverlap = set()  # node names whose height increased since last timer fire
-        self._deoverlap_timer = None  # created lazily on first use (PySide6 not imported at module level)
+        self.node_states = labelmaker_state.NodeStateStore(  # last line count etc. per node
+            dependents=[self.playback_throttle, labelmaker_tcl.failure_counts_singleton]
+        )
+        self._explicit_node = None  # set by autolabel_node, for use outside an autolabel callback
+        self.this = "this"  # TCL path of the node being labelled
+        self.unevaluated = []  # TCL of the current autolabel that failed to evaluate in explicit mode
+        self.deoverlap_scheduler = labelmaker_deoverlap.DeoverlapScheduler(profiler=self.profiler)
+
+    @property
+    def config(self):
+        return self._config
+
+    @config.setter
+    def config(self, config):
+        # plans are compiled from the config, so a new config means new plans
+        self._config = config
+        self.invalidate_plans()
+
+    def invalidate_plans(self):
+        """Drop all compiled plans and cached labels. Call when the config or prefs change."""
+        self._plans = {}
+        self.label_cache.clear()
+        self.label_snippets.clear()
+        labelmaker_tcl.failure_counts_singleton.clear()
+        self.playback_throttle.clear()
+        self.playback_throttle.max_rate = float(
+            labelmaker_prefs.prefs_singleton.get("playback_max_label_rate")
+        )
+
+    def get_plan(self, node_class):
+        try:
+            return self._plans[node_class]
+        except KeyError:
+            plan = labelmaker_plan.compile_plan(node_class, self.config.get(node_class))
+            self._plans[node_class] = plan
+            self._labelled_plans[node_class] = plan
+            return plan
+
+    def changed_classes(self, config):
+        """Node classes whose labels would change under config and the current prefs.
+
+        Compares the plan each class was last labelled with against a plan
+        compiled now, so call it after saving new prefs but before assigning
+        config.
+        """
+        return set(
+            node_class
+            for node_class, plan in self._labelled_plans.items()
+            if labelmaker_plan.compile_plan(node_class, config.get(node_class)) != plan
+        )
+
+    def on_config_classes_changed(self, node_classes):
+        """Forget plans and labels of node_classes after a config hot-reload, and relabel them."""
+        for node_class in node_classes:
+            self._plans.pop(node_class, None)
+        self.label_cache.discard_classes(node_classes)
+        self.relabel_classes(node_classes)
+
+    def relabel_classes(self, node_classes):
+        """Relabel, in the background, every node whose class maps to one of node_classes."""
+        if not node_classes:
+            return
+        true_classes = set(node_classes)
+        true_classes.update(
+            true_class
+            for true_class, node_class in self.class_mappings.items()
+            if node_class in node_classes
+        )
+        labelmaker_relabel.relabel_script(true_classes)
 
     def register_autolabel(self):
         nuke.addAutolabel(self.create_autolabel)
@@ -102,76 +205,228 @@ class AutolabelReplacement(object):
         else:
             self.unregister_autolabel()
 
-    def _get_deoverlap_timer(self):
-        if self._deoverlap_timer is None:
-            from PySide6 import QtCore
-            self._deoverlap_timer = QtCore.QTimer()
-            self._deoverlap_timer.setSingleShot(True)
-            self._deoverlap_timer.setInterval(150)
-            self._deoverlap_timer.timeout.connect(self._run_deoverlap)
-        return self._deoverlap_timer
-
-    def _run_deoverlap(self):
-        pending = self._pending_deoverlap.copy()
-        self._pending_deoverlap.clear()
-        for node_name in pending:
-            node = nuke.toNode(node_name)
-            if node:
-                labelmaker_deoverlap.deoverlap_downstream(node)
-
     def create_autolabel(self):
+        if self.profiler.enabled:
+            start = time.perf_counter()
+            autolabel = self._create_autolabel()
+            seconds = time.perf_counter() - start
+            self.profiler.record(self.node_true_class, "total", seconds)
+            self.stats.record_class(self.node_class, seconds, autolabel.count("\n") + 1)
+            return autolabel
+        return self._create_autolabel()
+
+    def autolabel_node(self, node):
+        """Return node's autolabel outside of an autolabel callback, e.g. headless.
+
+        Knobs are read by the node's full path rather than through thisNode(),
+        indicators are worked out in Python, and TCL that needs the
+        interpreter is run in the node's context with `in`. Any that still
+        fails is shown unevaluated and listed in self.unevaluated. No
+        de-overlap is triggered.
+        """
+        self._explicit_node = node
+        try:
+            return self.create_autolabel()
+        finally:
+            self._explicit_node = None
+
+    def _create_autolabel(self):
+        timed = self.profiler.time_call
         self.update()
-        self.set_indicators()
-        self.name_line_creator()
-        self.file_line_creator()
-        self.channels_line_creator()
-        self.knob_readout_creator()
-        self.mix_line_creator()
-        self.label_readout_creator()
-        autolabel = "\n".join(self.lines)
-        new_line_count = autolabel.count('\n') + 1
-        old_line_count = self._line_counts.get(self.node_name)
-        self._line_counts[self.node_name] = new_line_count
+        node_class = self.node_true_class
+        timed(node_class, "set_indicators", self.set_indicators)
+        node_key = self.n.fullName()
+        throttle = None
+        if self.indicators & 1 and labelmaker_prefs.prefs_singleton.get("playback_throttle_enabled"):
+            throttle = self.playback_throttle
+            throttle.observe_frame(nuke.frame())
+            held_label = throttle.held_label(self.n, node_key)
+            if held_label is not None:
+                return held_label
+        fingerprint = timed(node_class, "fingerprint", self.fingerprint)
+        if fingerprint is None:
+            self.label_cache.bypasses += 1
+            autolabel = None
+        else:
+            cache_key = (self.node_name, node_class, fingerprint)
+            autolabel = self.label_cache.get(cache_key)
+        if autolabel is None:
+            timed(node_class, "name_line_creator", self.name_line_creator)
+            timed(node_class, "file_line_creator", self.file_line_creator)
+            timed(node_class, "channels_line_creator", self.channels_line_creator)
+            timed(node_class, "knob_readout_creator", self.knob_readout_creator)
+            timed(node_class, "mix_line_creator", self.mix_line_creator)
+            timed(node_class, "label_readout_creator", self.label_readout_creator)
+            autolabel = "\n".join(self.lines)
+            if fingerprint is not None:
+                self.label_cache.put(cache_key, autolabel)
+        if throttle is not None:
+            throttle.labelled(node_key, autolabel)
+        state = self.node_states.get(node_key)
+        state.fingerprint_hash = None if fingerprint is None else hash(fingerprint)
+        old_line_count = state.line_count
+        label_hash = hash(autolabel)
+        if label_hash != state.label_hash:
+            state.label_hash = label_hash
+            state.line_count = autolabel.count('\n') + 1
         if (
             old_line_count is not None
-            and new_line_count > old_line_count
+            and state.line_count > old_line_count
             and labelmaker_prefs.prefs_singleton.get("deoverlap_enabled")
+            and self._explicit_node is None
         ):
-            self._pending_deoverlap.add(self.node_name)
-            self._get_deoverlap_timer().start()  # restarts timer if already running
+            timed(node_class, "deoverlap_trigger", self._queue_deoverlap)
+        elif (
+            old_line_count is not None
+            and state.line_count < old_line_count
+            and labelmaker_prefs.prefs_singleton.get("retract_enabled")
+            and self._explicit_node is None
+        ):
+            timed(node_class, "retract_trigger", self._queue_retract, old_line_count - state.line_count)
         return autolabel
 
+    def _queue_deoverlap(self):
+        self.deoverlap_scheduler.queue(self.node_name)
+
+    def _queue_retract(self, lines_lost):
+        self.deoverlap_scheduler.queue_retract(self.node_name, lines_lost)
+
+    def _tcl_subst(self, tcl_string):
+        self.tcl_evaluations += 1
+        if self._explicit_node is None:
+            return self.profiler.time_call(
+                self.node_true_class, "tcl_subst", nuke.tcl, "subst", tcl_string
+            )
+        # there is no thisNode() for a bare subst to use, so run it in the
+        # node's context instead
+        try:
+            return self.profiler.time_call(
+                self.node_true_class, "tcl_subst", nuke.tcl,
+                "in", self.this, "subst " + labelmaker_tcl.quote(tcl_string),
+            )
+        except RuntimeError:
+            self.unevaluated.append(tcl_string)
+            raise
+
+    def _evaluate_label_knob(self, label):
+        # the label knob can evaluate itself in its node's context
+        self.tcl_evaluations += 1
+        try:
+            evaluated = self.n["label"].evaluate()
+        except RuntimeError:
+            evaluated = None
+        if evaluated is None:
+            self.unevaluated.append(label)
+            raise RuntimeError("couldn't evaluate the label of {}".format(self.this))
+        return evaluated
+
     def update(self):
         self.lines = []
-        self.n = nuke.thisNode()
+        self.unevaluated = []
+        if self._explicit_node is None:
+            self.n = nuke.thisNode()
+            self.this = "this"
+        else:
+            self.n = self._explicit_node
+            self.this = self.n.fullName()
         self.node_name = self.n["name"].getValue()
         # sometimes we want the "true" class, i.e. Merge2, not Merge
         self.node_true_class = self.n.Class()
         # and sometimes we want to fudge the class a little
         # (so Merge2 becomes Merge), based on our class mapping
         # TODO: decide if we want to simply strip all trailing numbers...
-        self.node_class = self.class_mappings.get(self.n.Class()) or self.n.Class()
+        self.node_class = self.resolve_node_class(self.node_true_class)
+
+    def resolve_node_class(self, node_true_class):
+        mapped_class = self.class_mappings.get(node_true_class)
+        if mapped_class is None and node_true_class.startswith("OFX"):
+            mapped_class = self.ofx_mappings.lookup(node_true_class) or node_true_class
+            # remember misses too, so each OFX class is only looked up once
+            self.class_mappings[node_true_class] = mapped_class
+        return mapped_class or node_true_class
 
     def set_indicators(self):
         # this function is copied from Foundry's autolabel.py and
         # is copyright Foundry, all rights reserved
         # seemingly more or less need to use this TCL code, as there doesn't
         # seem to be python equivalents for these functions
-        ind = nuke.expression(
-            "(keys?1:0)+(has_expression?2:0)+(clones?8:0)+(viewsplit?32:0)"
-        )
-        if int(nuke.numvalue("maskChannelInput", 0)):
+        if self._explicit_node is None:
+            ind = nuke.expression(
+                "(keys?1:0)+(has_expression?2:0)+(clones?8:0)+(viewsplit?32:0)"
+            )
+        else:
+            ind = self.knob_indicators()
+        if int(nuke.numvalue(self.this + ".maskChannelInput", 0)):
             ind += 4
-        if int(nuke.numvalue("this.mix", 1)) < 1:
+        if int(nuke.numvalue(self.this + ".mix", 1)) < 1:
             ind += 16
-        nuke.knob("this.indicators", str(ind))
+        nuke.knob(self.this + ".indicators", str(ind))
+        self.indicators = int(ind)
+
+    def knob_indicators(self):
+        """The keys/has_expression/clones indicator bits, without TCL. viewsplit is not detected."""
+        animated = False
+        has_expression = False
+        for knob in self.n.knobs().values():
+            if not animated and getattr(knob, "isAnimated", None) is not None:
+                animated = knob.isAnimated()
+            if not has_expression and getattr(knob, "hasExpression", None) is not None:
+                has_expression = knob.hasExpression()
+        ind = 0
+        if animated:
+            ind += 1
+        if has_expression:
+            ind += 2
+        if self.n.clones():
+            ind += 8
+        return ind
+
+    def fingerprint(self):
+        """A cheap snapshot of everything the autolabel depends on.
+
+        Returns None when the label can depend on something outside the node's
+        own knobs (expressions, TCL in the config or label), in which case it
+        must not be cached.
+        """
+        if self.indicators & 2:
+            # has_expression: values can follow other nodes
+            return None
+        plan = self.get_plan(self.node_true_class)
+        if plan is not None and not plan.cacheable:
+            return None
+        knob_names = FINGERPRINT_KNOBS + plan.knob_names if plan else FINGERPRINT_KNOBS
+        values = []
+        label_knob_names = ()
+        for knob_name in knob_names:
+            knob = self.n.knob(knob_name)
+            if knob is None:
+                values.append(None)
+                continue
+            value = knob.toScript()
+            if knob_name in TCL_STRING_KNOBS and ("[" in value or "$" in value):
+                if knob_name != "label":
+                    return None
+                snippet = self.label_snippets.get(knob.value())
+                if not snippet.is_local:
+                    return None
+                label_knob_names = snippet.knob_names
+            values.append(value)
+        for knob_name in label_knob_names:
+            knob = self.n.knob(knob_name)
+            values.append(None if knob is None else knob.toScript())
+        values.append(node_mask_input_plugged(self.n))
+        values.append(self.indicators)
+        if self.indicators & 1:
+            # animated: the same knob scripts show different values per frame
+            values.append(nuke.frame())
+        return tuple(values)
 
     def name_line_creator(self):
         # specialcase a few nodes which should not have names
         if self.node_true_class in self.NAMELESS_NODES:
             return None
 
-        operation = nuke.value("this.operation", "none")
+        operation = nuke.value(self.this + ".operation", "none")
 
         # We should always know what class a node is.
         # If someone changes its name, display CLASS | NAME
@@ -189,22 +444,22 @@ class AutolabelReplacement(object):
         self.lines.append(name_line)
 
     def file_line_creator(self):
-        file_path = nuke.value("this.file", "-")
+        file_path = nuke.value(self.this + ".file", "-")
         if file_path != "" and file_path != "-":
             file_name = os.path.basename(file_path)
             self.lines.append(file_name)
 
     def channels_line_creator(self):
-        channels = nuke.value("this.channels", "-")
-        mask_input_b_stream = nuke.value("this.maskChannelInput", "none")
-        mask_input_side = nuke.value("this.maskChannelMask", "none")
+        channels = nuke.value(self.this + ".channels", "-")
+        mask_input_b_stream = nuke.value(self.this + ".maskChannelInput", "none")
+        mask_input_side = nuke.value(self.this + ".maskChannelMask", "none")
         mask_connected = node_mask_input_plugged(self.n)
-        mask_inverted = nuke.value("this.invert_mask", "false")
+        mask_inverted = nuke.value(self.this + ".invert_mask", "false")
         if mask_inverted == "true":
             mask_string = "Minv"
         else:
             mask_string = "M"
-        unpremult_and_premult = nuke.value("this.unpremult", "none")
+        unpremult_and_premult = nuke.value(self.this + ".unpremult", "none")
         unpremult = "none"
         premult = "none"
 
@@ -212,11 +467,11 @@ class AutolabelReplacement(object):
         if self.node_class in ("Premult", "Unpremult"):
             # we want these to be consistent with the normal
             # display other nodes use
-            channels = nuke.value("this.channels", "-")
+            channels = nuke.value(self.this + ".channels", "-")
             if self.node_class == "Unpremult":
-                unpremult = nuke.value("this.alpha", "none")
+                unpremult = nuke.value(self.this + ".alpha", "none")
             elif self.node_class == "Premult":
-                premult = nuke.value("this.alpha", "none")
+                premult = nuke.value(self.this + ".alpha", "none")
 
         elif self.node_class in ("Copy"):
             # Copy uses "channels" knob to do a layer copy from A to B
@@ -226,7 +481,7 @@ class AutolabelReplacement(object):
         elif self.node_class in ("Roto", "RotoPaint"):
             # roto uses "channels" knob to hold what channels to track
             # and uses "output" knob to hold the actual output
-            channels = nuke.value("this.output", "-")
+            channels = nuke.value(self.this + ".output", "-")
 
         if channels != "-":
             if mask_input_b_stream == "none" and not mask_connected:
@@ -253,154 +508,118 @@ class AutolabelReplacement(object):
             self.lines.append(channel_line)
 
     def knob_readout_creator(self):
-        # TODO: factor this monster class out
-        knob_dict_list = self.config.get(self.node_true_class)
+        plan = self.get_plan(self.node_true_class)
 
-        if knob_dict_list is None:
+        if plan is None:
             return
 
+        # per-entry stats are only collected while profiling
+        stats = self.stats if self.profiler.enabled else None
+
         knob_readouts = []
-        for item in knob_dict_list:
-
-            if "tcl_string" in item.keys():
-                tcl_string = str(item["tcl_string"])
-                try:
-                    label_string = nuke.tcl("subst", tcl_string)
-                except RuntimeError:
-                    label_string = tcl_string
+        for entry in plan.entries:
+
+            if stats is not None:
+                entry_start = time.perf_counter()
+                tcl_evaluations = self.tcl_evaluations
+
+            if isinstance(entry, labelmaker_plan.TclEntry):
+                label_string = entry.snippet.evaluate(self.n, self._tcl_subst, self.this)
                 if label_string is not None and label_string != "":
                     knob_readouts.append(label_string)
+                if stats is not None:
+                    stats.record_entry(
+                        self.node_class,
+                        entry.tcl_string,
+                        time.perf_counter() - entry_start,
+                        tcl_evaluations=self.tcl_evaluations - tcl_evaluations,
+                        lines=label_string.count("\n") + 1 if label_string else 0,
+                    )
+                continue
+
+            try:
+                knob = self.n[entry.name]
+            except NameError:
+                # the knob does not exist on the node, just continue
+                if labelmaker_plan.knob_missing(plan.node_class, entry.name):
+                    # lint found it missing too, so stop looking it up
+                    self._plans.pop(self.node_true_class, None)
+                if stats is not None:
+                    stats.record_entry(
+                        self.node_class, entry.name, time.perf_counter() - entry_start, missing_knob=True
+                    )
+                continue
+            knob_value = knob.value()
+            # handle knobs which should be colorized, if colorization isn't disabled
+            colorize = False
+            if knob.Class() in labelmaker_plan.COLOR_KNOB_CLASSES:
+                colorize = entry.colorize
+            # this handles knobs like translate that return a list
+            # and formats them nicely
+            if isinstance(knob_value, (list, tuple)):
+                knob_value_formatted = labelmaker_plan.format_knob_values(knob_value)
+                show = entry.show_always or knob_value_formatted != entry.formatted_default
             else:
-                knob_label = item.get("label", item["name"])
-                # always show if user has selected to always show, otherwise fall back
-                # to the node's setting from the config
-                always_show = labelmaker_prefs.prefs_singleton.get(
-                    "always_show_all"
-                ) or item.get("always_show", False)
-                default = item.get("default", False)
-                try:
-                    knob_value = self.n[item["name"]].value()
-                    knob_class = self.n[item["name"]].Class()
-                except NameError:
-                    # the knob does not exist on the node, just continue
-                    continue
-                show = False
-                # handle knobs which should be colorized, if colorization isn't disabled
-                colorize = False
-                if knob_class in (
-                    "Color_Knob",
-                    "AColor_Knob",
-                ) and not labelmaker_prefs.prefs_singleton.get("colorize_disable"):
-                    colorize = item.get("colorize", True)
-                # this handles knobs like translate that return a list
-                # and formats them nicely
-                if isinstance(knob_value, (list, tuple)):
-                    knob_value_formatted = self.format_knob_values(knob_value)
-                    try:
-                        formatted_default = self.format_knob_values(default)
-                    except TypeError:
-                        # default isn't iterable
-                        formatted_default = self.format_knob_value(default)
-                    if (
-                        default is False
-                        or knob_value_formatted != formatted_default
-                        or always_show
-                    ):
-                        show = True
+                knob_value_formatted = labelmaker_plan.format_knob_value(knob_value)
+                show = entry.show_always or knob_value != entry.default
+            if show:
+                # if we want to colorize the knob readout, we need to manually
+                # centre the whole autolabel with a <div>, to work around a nuke
+                # bug where adding HTML to a node left-justifies everything
+                if not colorize:
+                    label_string = "{} {}".format(entry.label, knob_value_formatted)
                 else:
-                    knob_value_formatted = self.format_knob_value(knob_value)
-
-                    if default is False or knob_value != item["default"] or always_show:
-                        show = True
-                if show:
-                    # if we want to colorize the knob readout, we need to manually
-                    # centre the whole autolabel with a <div>, to work around a nuke
-                    # bug where adding HTML to a node left-justifies everything
-                    if not colorize:
-                        label_string = "{} {}".format(knob_label, knob_value_formatted)
+                    label_string = self.colorize_knob_readout(
+                        knob_value, entry.label, knob_value_formatted
+                    )
+                    # to avoid adding an extra line, we need to jam our wrapper onto the front of the first item
+                    if len(self.lines) > 0:
+                        self.lines[0] = "{}{}".format(
+                            self.centre_wrapper(), self.lines[0]
+                        )
+                    elif len(knob_readouts) > 0:
+                        # there is already a readout which will be the first thing in the node
+                        knob_readouts[0] = "{}{}".format(
+                            self.centre_wrapper(), knob_readouts[0]
+                        )
                     else:
-                        label_string = self.colorize_knob_readout(
-                            knob_value, knob_label, knob_value_formatted
+                        # this will be the first thin
+                        label_string = "{}{}".format(
+                            self.centre_wrapper(), label_string
                         )
-                        # to avoid adding an extra line, we need to jam our wrapper onto the front of the first item
-                        if len(self.lines) > 0:
-                            self.lines[0] = "{}{}".format(
-                                self.centre_wrapper(), self.lines[0]
-                            )
-                        elif len(knob_readouts) > 0:
-                            # there is already a readout which will be the first thing in the node
-                            knob_readouts[0] = "{}{}".format(
-                                self.centre_wrapper(), knob_readouts[0]
-                            )
-                        else:
-                            # this will be the first thin
-                            label_string = "{}{}".format(
-                                self.centre_wrapper(), label_string
-                            )
 
-                    knob_readouts.append(label_string)
+                knob_readouts.append(label_string)
+            if stats is not None:
+                stats.record_entry(
+                    self.node_class, entry.name, time.perf_counter() - entry_start, lines=int(show)
+                )
         knob_readout = "\n".join(knob_readouts)
 
         if knob_readout != "":
             self.lines.append(knob_readout)
 
     def mix_line_creator(self):
-        mix = nuke.value("this.mix", "none")
+        mix = nuke.value(self.this + ".mix", "none")
         if mix != "none" and float(mix) != 1.0:
             mix_line = "mix {:.3f}".format(float(mix))
             self.lines.append(mix_line)
 
     def label_readout_creator(self):
-        node_label_value = nuke.value("this.label", "")
-        try:
-            node_label_value = nuke.tcl("subst", node_label_value)
-        except RuntimeError:
-            # TCL execution failed, so just use the label as-is
-            pass
+        node_label_value = nuke.value(self.this + ".label", "")
+        if labelmaker_tcl.needs_subst(node_label_value):
+            # falls back to the label as-is if TCL execution fails
+            tcl_subst = self._tcl_subst if self._explicit_node is None else self._evaluate_label_knob
+            node_label_value = self.label_snippets.get(node_label_value).evaluate(
+                self.n, tcl_subst, self.this
+            )
         if node_label_value != "" and node_label_value is not None:
             self.lines.append(node_label_value)
 
     def format_knob_values(self, values):
-        values_string_list = [self.format_knob_value(value) for value in values]
-        values_formatted = ", ".join(values_string_list)
-        return values_formatted
+        return labelmaker_plan.format_knob_values(values)
 
     def format_knob_value(self, value):
-        if isinstance(value, (float)):
-            knob_value_formatted = "{:.3f}".format(value)
-        else:
-            knob_value_formatted = "{}".format(value)
-        return knob_value_formatted
-
-    def recurse_into_menu(self, m):
-        menu_item_leaves = []
-        for item in m.items():
-            if isinstance(item, nuke.Menu):
-                menu_item_leaves = menu_item_leaves + self.recurse_into_menu(item)
-            elif isinstance(item, nuke.MenuItem):
-                try:
-                    script = item.script()
-                    name = item.name()
-                    leaf = (name, script)
-                    menu_item_leaves.append(leaf)
-                except Exception:
-                    # TODO: don't except everything?
-                    pass
-        return menu_item_leaves
-
-    def find_ofx_class(self, menu_script):
-        regex = re.search(r"OFX.*(?=[\'\"])", menu_script)
-        if regex:
-            return regex.group(0)
-        else:
-            return None
-
-    def update_class_mappings_with_ofx_nodes(self):
-        m = nuke.toolbar("Nodes")
-        all_toolbar_items = self.recurse_into_menu(m)
-        ofx_items = [item for item in all_toolbar_items if "OFX" in item[1]]
-        ofx_mappings = {self.find_ofx_class(item[1]): item[0] for item in ofx_items}
-        self.class_mappings.update(ofx_mappings)
+        return labelmaker_plan.format_knob_value(value)
 
     def centre_wrapper(self):
         # work around nuke HTML wonkiness - need to explicitly set the alignment and font
@@ -412,24 +631,14 @@ class AutolabelReplacement(object):
         return centre_style_div
 
     def clamp(self, value, low=0.0, high=1.0):
-        return min(max(value, low), high)
+        return labelmaker_color.clamp(value, low, high)
 
     def sRGBish(self, value):
         return self.clamp(value ** 0.454, 0, 1) * 255
 
     def alexToRecish(self, value):
-        a = 0.023
-        b = 0.888
-        c = 0.293
-        d = 1.02
-        e = 0.023
         # very rough curve approximating alexa to rec709 function
-        # clamp to 0 to 1 and mult by 255 for hexification
-        value = self.clamp(value, 0.0, 12.0)
-        luted_value = int(
-            self.clamp((d + ((a - d) / (1 + pow(value / c, b)))) - e) * 255
-        )
-        return luted_value
+        return labelmaker_color.tonemap(value)
 
     def colorize_knob_readout(self, knob_value, knob_label, knob_value_formatted):
         # TODO: should only colorize some part of this, to avoid covering
@@ -441,41 +650,19 @@ class AutolabelReplacement(object):
         #       rarely have color knobs
         basic_colorize_span = (
             '<span style="background-color: '
-            "#{r:02X}{g:02X}{b:02X}; "
+            "{background_color}; "
             'color: {text_color};">'
             "{knob_label}: </span> {knob_value_formatted}"
             "</span>"
         )
 
-        if isinstance(knob_value, (list, tuple)) and len(knob_value) >= 3:
-            color_tuple = (
-                self.alexToRecish(knob_value[0]),
-                self.alexToRecish(knob_value[1]),
-                self.alexToRecish(knob_value[2]),
-            )
-        elif isinstance(knob_value, (int, float)):
-            color_tuple = (
-                self.alexToRecish(knob_value),
-                self.alexToRecish(knob_value),
-                self.alexToRecish(knob_value),
-            )
-        else:
+        channels = labelmaker_color.swatch_channels(knob_value)
+        if channels is None:
             # not a number or list, can't be colorized
             return knob_value_formatted
-
-        # do a rough approx of the luminance of our background color
-        background_luminance = (
-            color_tuple[0] * 0.34 + color_tuple[1] * 0.5 + color_tuple[2] * 0.16
-        ) / 255.0
-        # since we've sort of
-        if background_luminance > 0.22:
-            text_color = "black"
-        else:
-            text_color = "white"
+        background_color, text_color = labelmaker_color.swatch(channels)
         colorized_readout = basic_colorize_span.format(
-            r=color_tuple[0],
-            g=color_tuple[1],
-            b=color_tuple[2],
+            background_color=background_color,
             text_color=text_color,
             knob_label=knob_label,
             knob_value_formatted=knob_value_formatted,
@@ -485,5 +672,7 @@ class AutolabelReplacement(object):
 
 config_object = labelmaker_config.composed_config_singleton
 autolabeller_singleton = AutolabelReplacement(config_object)
+labelmaker_deoverlap.register_graph_callbacks()
+autolabeller_singleton.node_states.register_callbacks()
 if labelmaker_prefs.prefs_singleton.get("labelmaker_enabled"):
     autolabeller_singleton.register_autolabel()
@@ -0,0 +1,178 @@
+"""Headless label pre-render, e.g. as a render-farm preflight step.
+
+Opens each script in its own `nuke -t` process, runs the autolabeller over
+every node (Groups included), de-overlaps the result and writes a JSON
+sidecar next to the script, `<script>.labelmaker.json`, with each node's
+class, label text, indicator flags and position. TCL in labels is evaluated
+in each node's context; any that fails is left as-is in the label and also
+listed under the node's "unevaluated" key. With --write-back the
+positions and indicators are also saved into the script itself; label text
+is never written to the script, since Nuke recomputes it on load.
+
+Run the driver with any Python, pointing it at Nuke:
+
+    python labelmaker_batch.py --nuke /path/to/Nuke --jobs 8 shot_*.nk
+
+or set LABELMAKER_NUKE_EXECUTABLE instead of passing --nuke. Scripts are
+processed --jobs at a time, one Nuke process each, since a Nuke process can
+only have one script open.
+
+There is no DAG under `nuke -t`, so node sizes are estimated from the label
+line count rather than measured; see estimate_size.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+
+NUKE_EXECUTABLE_ENV_VAR = "LABELMAKER_NUKE_EXECUTABLE"
+SIDECAR_SUFFIX = ".labelmaker.json"
+
+# DAG sizes used when screenWidth/screenHeight are unavailable
+NODE_WIDTH = 80
+NODE_HEIGHT = 18  # a node with a one-line label
+LABEL_LINE_HEIGHT = 12  # each further label line
+DOT_SIZE = 12
+
+
+def sidecar_path(script_path, out_dir=None):
+    if out_dir is None:
+        return script_path + SIDECAR_SUFFIX
+    return os.path.join(out_dir, os.path.basename(script_path) + SIDECAR_SUFFIX)
+
+
+def estimate_size(node, label):
+    """(width, height) of node in the DAG given its autolabel, measured if there is a DAG."""
+    width = node.screenWidth()
+    height = node.screenHeight()
+    if width and height:
+        return width, height
+    if node.Class() == "Dot":
+        return DOT_SIZE, DOT_SIZE
+    line_count = label.count("\n") + 1 if label else 1
+    return NODE_WIDTH, NODE_HEIGHT + LABEL_LINE_HEIGHT * (line_count - 1)
+
+
+def label_open_script(autolabeller, deoverlap=True):
+    """Label and de-overlap every node in the open script.
+
+    Returns {node full name: {"class", "label", "indicators", "xpos", "ypos"}},
+    plus "unevaluated" for nodes with TCL that failed to evaluate.
+    """
+    # nuke and the labeller are only importable inside Nuke, and the driver
+    # below runs in a plain Python, so they are imported where they're used
+    import nuke
+    import labelmaker_deoverlap
+
+    nodes = nuke.allNodes(recurseGroups=True)
+    records = {}
+    for node in nodes:
+        records[node.fullName()] = {
+            "class": node.Class(),
+            "label": autolabeller.autolabel_node(node),
+            "indicators": autolabeller.indicators,
+        }
+        if autolabeller.unevaluated:
+            records[node.fullName()]["unevaluated"] = list(autolabeller.unevaluated)
+    if deoverlap:
+        labelmaker_deoverlap.deoverlap_all(
+            recursive=True,
+            measure=lambda node: estimate_size(node, records[node.fullName()]["label"]),
+        )
+    for node in nodes:
+        record = records[node.fullName()]
+        record["xpos"] = node.xpos()
+        record["ypos"] = node.ypos()
+    return records
+
+
+def process_script(script_path, write_back=False, out_dir=None, deoverlap=True):
+    """Worker: open script_path, label it, write the sidecar and optionally save the script."""
+    import nuke
+    import labelmaker
+
+    nuke.scriptOpen(script_path)
+    try:
+        records = label_open_script(labelmaker.autolabeller_singleton, deoverlap)
+        path = sidecar_path(script_path, out_dir)
+        with open(path, "w") as f:
+            json.dump({
+                "script": os.path.abspath(script_path),
+                "nuke_version": nuke.NUKE_VERSION_STRING,
+                "nodes": records,
+            }, f, indent=2, sort_keys=True)
+        if write_back:
+            nuke.scriptSave(script_path)
+    finally:
+        nuke.scriptClose()
+    print("{}: labelled {} nodes, wrote {}".format(script_path, len(records), path))
+
+
+def _worker_command(nuke_executable, script_path, args):
+    command = [nuke_executable, "-t", os.path.abspath(__file__), "--worker"]
+    if args.write_back:
+        command.append("--write-back")
+    if args.out is not None:
+        command.extend(["--out", args.out])
+    if args.no_deoverlap:
+        command.append("--no-deoverlap")
+    command.append(script_path)
+    return command
+
+
+def run_pool(nuke_executable, args):
+    """Run one worker per script, args.jobs at a time. Returns the number of failed scripts."""
+    failures = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(
+                subprocess.run,
+                _worker_command(nuke_executable, script_path, args),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+            ): script_path
+            for script_path in args.scripts
+        }
+        for future in concurrent.futures.as_completed(futures):
+            script_path = futures[future]
+            result = future.result()
+            if result.returncode == 0:
+                print(result.stdout.strip().splitlines()[-1] if result.stdout.strip() else script_path)
+            else:
+                failures += 1
+                print("{}: failed with exit code {}".format(script_path, result.returncode))
+                print(result.stdout)
+    return failures
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scripts", nargs="+", help=".nk scripts to label")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="scripts processed at once")
+    parser.add_argument("--write-back", action="store_true", help="save positions and indicators into the scripts")
+    parser.add_argument("--out", help="directory for the sidecars (default: next to each script)")
+    parser.add_argument("--no-deoverlap", action="store_true", help="leave node positions alone")
+    parser.add_argument("--nuke", help="Nuke executable (default: ${})".format(NUKE_EXECUTABLE_ENV_VAR))
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        for script_path in args.scripts:
+            process_script(script_path, args.write_back, args.out, not args.no_deoverlap)
+        return 0
+
+    nuke_executable = args.nuke or os.environ.get(NUKE_EXECUTABLE_ENV_VAR)
+    if not nuke_executable:
+        parser.error("pass --nuke or set {}".format(NUKE_EXECUTABLE_ENV_VAR))
+    if args.out is not None and not os.path.isdir(args.out):
+        os.makedirs(args.out)
+    failures = run_pool(nuke_executable, args)
+    print("{} of {} scripts labelled".format(len(args.scripts) - failures, len(args.scripts)))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,62 @@
+"""Bounded LRU cache of autolabel results.
+
+Nuke asks for a node's autolabel far more often than the label changes, so
+results are cached under (node name, node class, fingerprint), where the fingerprint
+captures every knob the label depends on. Keeping several fingerprints per
+node also means flipping a knob back and forth, or stepping between keyed
+frames, is served from the cache.
+"""
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 8192
+
+
+class LabelCache(object):
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        super(LabelCache, self).__init__()
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0  # lookups skipped because the node could not be fingerprinted
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached label for key, or None."""
+        try:
+            label = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return label
+
+    def put(self, key, label):
+        self._entries[key] = label
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry. Counters are kept so they span reloads."""
+        self._entries.clear()
+
+    def discard_classes(self, node_classes):
+        """Drop the entries of nodes of the given classes."""
+        stale_keys = [key for key in self._entries if key[1] in node_classes]
+        for key in stale_keys:
+            del self._entries[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": float(self.hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,74 @@
+"""Colour swatches for colorized knob readouts.
+
+Turning a colour knob's value into a swatch means a rough Alexa-to-Rec709
+tonemap per channel (a pow and two clamps) plus a luminance check for the
+text colour. Grade-heavy scripts show the same few values (0, 1, small
+tweaks) over and over, so tonemapped channels and finished swatches are
+memoised by value.
+"""
+MEMO_MAX_SIZE = 65536
+
+# very rough curve approximating alexa to rec709 function
+_A = 0.023
+_B = 0.888
+_C = 0.293
+_D = 1.02
+_E = 0.023
+
+_tonemapped = {}  # {channel value: 0-255 int}
+_swatches = {}  # {(r, g, b) channel values: (hex colour, text colour)}
+
+
+def clamp(value, low=0.0, high=1.0):
+    return min(max(value, low), high)
+
+
+def alexa_to_rec_ish(value):
+    """Tonemap one channel value to a 0-255 int, without memoisation."""
+    # clamp to 0 to 1 and mult by 255 for hexification
+    value = clamp(value, 0.0, 12.0)
+    return int(clamp((_D + ((_A - _D) / (1 + pow(value / _C, _B)))) - _E) * 255)
+
+
+def tonemap(value):
+    """Memoised alexa_to_rec_ish."""
+    try:
+        return _tonemapped[value]
+    except KeyError:
+        pass
+    result = alexa_to_rec_ish(value)
+    if len(_tonemapped) >= MEMO_MAX_SIZE:
+        _tonemapped.clear()
+    _tonemapped[value] = result
+    return result
+
+
+def swatch_channels(knob_value):
+    """The (r, g, b) values to colour knob_value's swatch with, or None if it can't be colorized."""
+    if isinstance(knob_value, (list, tuple)) and len(knob_value) >= 3:
+        return (knob_value[0], knob_value[1], knob_value[2])
+    if isinstance(knob_value, (int, float)):
+        return (knob_value, knob_value, knob_value)
+    return None
+
+
+def swatch(channels):
+    """Return (hex colour, text colour) for the swatch of an (r, g, b) tuple."""
+    try:
+        return _swatches[channels]
+    except KeyError:
+        pass
+    red, green, blue = tonemap(channels[0]), tonemap(channels[1]), tonemap(channels[2])
+    # do a rough approx of the luminance of our background color
+    background_luminance = (red * 0.34 + green * 0.5 + blue * 0.16) / 255.0
+    text_color = "black" if background_luminance > 0.22 else "white"
+    result = ("#{:02X}{:02X}{:02X}".format(red, green, blue), text_color)
+    if len(_swatches) >= MEMO_MAX_SIZE:
+        _swatches.clear()
+    _swatches[channels] = result
+    return result
+
+
+def clear():
+    _tonemapped.clear()
+    _swatches.clear()
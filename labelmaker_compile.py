@@ -0,0 +1,188 @@
+"""Compile config layers into one read-only file that many Nuke processes can share.
+
+Every Nuke process normally parses the base and facility JSON configs and
+keeps its own copy. A compiled config is the composed result of those layers
+in a compact binary file, which LabelMakerComposedConfig memory-maps instead
+(set LABELMAKER_COMPILED_CONFIG to its path). The OS shares the mapped pages
+between processes, and each node class's entries are only decoded the first
+time that class is looked up. Personal configs are still read as JSON and
+overlaid on top.
+
+Build one, e.g. whenever facility configs are deployed, with any Python:
+
+    python labelmaker_compile.py -o /facility/labelmaker.lmc base_config.json site.json show.json
+
+Layers are given in cascade order; later ones override earlier ones, per
+node class.
+
+File layout (all integers little-endian):
+
+    header   magic "LMKC", u16 format version, u16 reserved, u32 class count,
+             u32 metadata length
+    metadata JSON: {"sources": [[path, size, mtime], ...]}
+    index    per class, sorted by name: u16 name length, name (UTF-8),
+             u64 entries offset, u32 entries length
+    entries  per class, compact JSON of its list of entries
+
+Processes keep the file mapped, so deploy a new compile by writing it to a
+new path (or replacing it atomically, which this tool does) rather than
+overwriting it in place.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+MAGIC = b"LMKC"
+# Bump when the file layout changes
+COMPILED_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHII")
+_NAME_LENGTH = struct.Struct("<H")
+_INDEX_LOCATION = struct.Struct("<QI")
+
+
+class CompiledConfigError(ValueError):
+    pass
+
+
+def compose_layers(paths):
+    """{node_class: entries} of the JSON configs at paths, later ones winning."""
+    composed = {}
+    for path in paths:
+        with open(path, "r") as f:
+            composed.update(json.load(f))
+    return composed
+
+
+def compile_config(paths, output_path):
+    """Compose the JSON configs at paths and write them to output_path atomically."""
+    composed = compose_layers(paths)
+    metadata = json.dumps({
+        "sources": [
+            [os.path.abspath(path), os.stat(path).st_size, os.stat(path).st_mtime]
+            for path in paths
+        ],
+    }, separators=(",", ":")).encode("utf-8")
+
+    node_classes = sorted(composed)
+    encoded_names = [node_class.encode("utf-8") for node_class in node_classes]
+    encoded_entries = [
+        json.dumps(composed[node_class], separators=(",", ":")).encode("utf-8")
+        for node_class in node_classes
+    ]
+    index_size = sum(
+        _NAME_LENGTH.size + len(name) + _INDEX_LOCATION.size for name in encoded_names
+    )
+    offset = _HEADER.size + len(metadata) + index_size
+
+    chunks = [
+        _HEADER.pack(MAGIC, COMPILED_FORMAT_VERSION, 0, len(node_classes), len(metadata)),
+        metadata,
+    ]
+    for name, entries in zip(encoded_names, encoded_entries):
+        chunks.append(_NAME_LENGTH.pack(len(name)))
+        chunks.append(name)
+        chunks.append(_INDEX_LOCATION.pack(offset, len(entries)))
+        offset += len(entries)
+    chunks.extend(encoded_entries)
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        # mkstemp makes the file private, but it's meant to be shared
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return len(node_classes)
+
+
+class CompiledConfig(object):
+    """Read-only {node_class: entries} mapping over a memory-mapped compiled config.
+
+    Only the class index is read when opened; entries are decoded on first
+    lookup and kept. Raises CompiledConfigError if the file isn't a compiled
+    config of a version this code understands.
+    """
+
+    def __init__(self, path):
+        super(CompiledConfig, self).__init__()
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_index()
+        except (struct.error, ValueError) as error:
+            self.close()
+            raise CompiledConfigError("{} is not a usable compiled config: {}".format(path, error))
+        self._decoded = {}
+
+    def _read_index(self):
+        magic, version, _, class_count, metadata_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("bad magic {!r}".format(magic))
+        if version != COMPILED_FORMAT_VERSION:
+            raise ValueError("format version {}, expected {}".format(version, COMPILED_FORMAT_VERSION))
+        position = _HEADER.size
+        self.metadata = json.loads(self._map[position:position + metadata_length].decode("utf-8"))
+        position += metadata_length
+        self._index = {}  # {node_class: (offset, length)}
+        for _ in range(class_count):
+            (name_length,) = _NAME_LENGTH.unpack_from(self._map, position)
+            position += _NAME_LENGTH.size
+            name = self._map[position:position + name_length].decode("utf-8")
+            position += name_length
+            self._index[name] = _INDEX_LOCATION.unpack_from(self._map, position)
+            position += _INDEX_LOCATION.size
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, node_class):
+        return node_class in self._index
+
+    def __getitem__(self, node_class):
+        entries = self._decoded.get(node_class)
+        if entries is None:
+            offset, length = self._index[node_class]
+            entries = self._decoded[node_class] = json.loads(
+                self._map[offset:offset + length].decode("utf-8")
+            )
+        return entries
+
+    def get(self, node_class, default=None):
+        if node_class not in self._index:
+            return default
+        return self[node_class]
+
+    def keys(self):
+        return self._index.keys()
+
+    def close(self):
+        self._map.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("configs", nargs="+", help="JSON config layers, in cascade order")
+    parser.add_argument("-o", "--output", required=True, help="compiled config to write")
+    args = parser.parse_args(argv)
+    class_count = compile_config(args.configs, args.output)
+    print("Compiled {} node classes from {} configs into {}".format(
+        class_count, len(args.configs), args.output
+    ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,7 +1,12 @@
+import hashlib
 import json
 import os
+import pickle
+import tempfile
 from collections import UserDict
 import nuke
+import labelmaker_compile
+import labelmaker_io
 import labelmaker_prefs
 
 # Location of the default config shipped with Labelmaker
@@ -25,64 +30,202 @@ CONFIGS_NAMES_ENV_VAR = "LABELMAKER_CONFIGS_NAMES"
 # Do not include Labelmaker's default config or your personal config
 CONFIGS_PATHS_ENV_VAR = "LABELMAKER_CONFIGS_PATHS"
 
+# How often, in milliseconds, ConfigWatcher checks config files for changes.
+# Set this env var to 0 to disable watching.
+CONFIG_WATCH_INTERVAL_ENV_VAR = "LABELMAKER_CONFIG_WATCH_INTERVAL"
+DEFAULT_CONFIG_WATCH_INTERVAL_MS = 2000
+
+# Where Labelmaker keeps local caches, such as the compiled config.
+# Defaults to ~/.nuke/labelmaker_cache
+CACHE_DIR_ENV_VAR = "LABELMAKER_CACHE_DIR"
+# Bump when the layout of the compiled config cache changes
+COMPILED_CONFIG_CACHE_VERSION = 1
+
+# Path of a shared config built with labelmaker_compile.py. When set, it
+# replaces the base and facility JSON configs; personal configs still apply.
+COMPILED_CONFIG_ENV_VAR = "LABELMAKER_COMPILED_CONFIG"
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV_VAR) or os.path.join(
+        os.path.expanduser("~"), ".nuke", "labelmaker_cache"
+    )
+
+
+def config_layer_specs(warn=True, shared_layers=True):
+    """Return [(name, path), ...] for every config layer that exists, in cascade order.
+
+    shared_layers=False leaves out the base and facility configs, e.g. when
+    they come from a compiled config instead.
+    """
+    specs = []
+
+    personal_config_path = labelmaker_prefs.prefs_singleton.get(
+        "personal_config_path"
+    ) or os.path.join(os.path.expanduser("~"), ".nuke", "labelmaker_config.json")
+
+    use_base_config = labelmaker_prefs.prefs_singleton.get("use_base_config")
+    if shared_layers and os.path.exists(DEFAULT_CONFIG_PATH) and use_base_config:
+        specs.append(("default", DEFAULT_CONFIG_PATH))
+
+    if (
+        shared_layers
+        and CONFIGS_NAMES_ENV_VAR in os.environ.keys()
+        and CONFIGS_PATHS_ENV_VAR in os.environ.keys()
+    ):
+        custom_config_names = os.environ[CONFIGS_NAMES_ENV_VAR].split(os.pathsep)
+        custom_config_paths = os.environ[CONFIGS_PATHS_ENV_VAR].split(os.pathsep)
+        if warn and len(custom_config_names) != len(custom_config_paths):
+            nuke.warning(
+                "Labelmaker: {} and {} have different lengths ({} vs {}). "
+                "Extra entries will be ignored.".format(
+                    CONFIGS_NAMES_ENV_VAR,
+                    CONFIGS_PATHS_ENV_VAR,
+                    len(custom_config_names),
+                    len(custom_config_paths),
+                )
+            )
+        custom_config_tuples = zip(custom_config_names, custom_config_paths)
+        for custom_config_tuple in custom_config_tuples:
+            if os.path.exists(custom_config_tuple[1]):
+                specs.append(custom_config_tuple)
+
+    if os.path.exists(personal_config_path):
+        specs.append(("personal", personal_config_path))
+
+    return specs
+
+
+def file_signature(path):
+    """(mtime, size) of path, or None if it can't be read. Cheap enough to poll on NFS."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def open_compiled_config(path):
+    """The CompiledConfig at path, or None (with a warning) if it can't be used."""
+    try:
+        return labelmaker_compile.CompiledConfig(path)
+    except (IOError, OSError, ValueError) as error:
+        nuke.warning("Labelmaker: not using compiled config {}: {}".format(path, error))
+        return None
+
+
+def _compiled_cache_path(layer_specs):
+    # one cache file per combination of layer paths, so switching between
+    # shows or personal configs doesn't keep invalidating a single file
+    paths_digest = hashlib.sha1(
+        json.dumps(layer_specs).encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(cache_dir(), "composed_config_{}.pickle".format(paths_digest))
+
+
+def load_compiled_cache(layer_specs, signatures):
+    """Return {layer name: data} if a valid cache exists for exactly these layer files."""
+    if None in signatures:
+        return None
+    try:
+        with open(_compiled_cache_path(layer_specs), "rb") as f:
+            cached = pickle.load(f)
+    except Exception:
+        # missing, truncated or from an incompatible Python; just rebuild
+        return None
+    expected_layers = [
+        [name, path, list(signature)]
+        for (name, path), signature in zip(layer_specs, signatures)
+    ]
+    if (
+        not isinstance(cached, dict)
+        or cached.get("version") != COMPILED_CONFIG_CACHE_VERSION
+        or cached.get("layers") != expected_layers
+    ):
+        return None
+    return cached["data"]
+
+
+def save_compiled_cache(layer_specs, configs):
+    """Write the parsed layers out atomically. Failures are ignored; it's only a cache."""
+    if any(config.signature is None for config in configs):
+        return
+    cache_path = _compiled_cache_path(layer_specs)
+    cached = {
+        "version": COMPILED_CONFIG_CACHE_VERSION,
+        "layers": [[config.name, config.path, list(config.signature)] for config in configs],
+        "data": {config.name: config.data for config in configs},
+    }
+    try:
+        if not os.path.isdir(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(cache_path), suffix=".tmp"
+        )
+        with os.fdopen(file_descriptor, "wb") as f:
+            pickle.dump(cached, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except (IOError, OSError, pickle.PicklingError):
+        pass
+
+
 class LabelMakerComposedConfig(object):
     """Compose a config out of the various configs.
 
     Intended for use by the actual labelmaker.
+
+    Parsed layers are cached in a pickle under cache_dir(), keyed by each
+    layer's path, size and mtime, so an unchanged cascade only costs a stat
+    per layer and one local read at startup.
+
+    If COMPILED_CONFIG_ENV_VAR points to a compiled config, it stands in for
+    the base and facility layers. composed_config_dict then only holds the
+    classes the remaining (personal) layers define, and other lookups fall
+    through to the memory-mapped compiled config.
     """
 
     def __init__(self):
         super(LabelMakerComposedConfig, self).__init__()
-        self.configs = []
-
-        personal_config_path = labelmaker_prefs.prefs_singleton.get(
-            "personal_config_path"
-        ) or os.path.join(os.path.expanduser("~"), ".nuke", "labelmaker_config.json")
-
-        use_base_config = labelmaker_prefs.prefs_singleton.get("use_base_config")
-        if os.path.exists(DEFAULT_CONFIG_PATH) and use_base_config:
-            default_config = LabelMakerConfig(name="default", path=DEFAULT_CONFIG_PATH)
-            self.configs.append(default_config)
-
-        if (
-            CONFIGS_NAMES_ENV_VAR in os.environ.keys()
-            and CONFIGS_PATHS_ENV_VAR in os.environ.keys()
-        ):
-            custom_config_names = os.environ[CONFIGS_NAMES_ENV_VAR].split(os.pathsep)
-            custom_config_paths = os.environ[CONFIGS_PATHS_ENV_VAR].split(os.pathsep)
-            if len(custom_config_names) != len(custom_config_paths):
-                nuke.warning(
-                    "Labelmaker: {} and {} have different lengths ({} vs {}). "
-                    "Extra entries will be ignored.".format(
-                        CONFIGS_NAMES_ENV_VAR,
-                        CONFIGS_PATHS_ENV_VAR,
-                        len(custom_config_names),
-                        len(custom_config_paths),
-                    )
-                )
-            custom_config_tuples = zip(custom_config_names, custom_config_paths)
-            for custom_config_tuple in custom_config_tuples:
-                if os.path.exists(custom_config_tuple[1]):
-                    custom_config = LabelMakerConfig(
-                        name=custom_config_tuple[0], path=custom_config_tuple[1]
-                    )
-                    self.configs.append(custom_config)
-
-        if os.path.exists(personal_config_path):
-            personal_config = LabelMakerConfig(
-                name="personal", path=personal_config_path
-            )
-            self.configs.append(personal_config)
+        self.compiled_path = os.environ.get(COMPILED_CONFIG_ENV_VAR) or None
+        self.compiled_signature = None
+        self.compiled = None
+        if self.compiled_path is not None:
+            self.compiled_signature = file_signature(self.compiled_path)
+            self.compiled = open_compiled_config(self.compiled_path)
+        layer_specs = config_layer_specs(shared_layers=self.compiled is None)
+        signatures = [file_signature(path) for _, path in layer_specs]
+        cached_data = load_compiled_cache(layer_specs, signatures)
+        if cached_data is not None:
+            self.configs = [
+                LabelMakerConfig(name=name, path=path, data=cached_data[name], signature=signature)
+                for (name, path), signature in zip(layer_specs, signatures)
+            ]
+        else:
+            self.configs = [
+                LabelMakerConfig(name=name, path=path) for name, path in layer_specs
+            ]
+            save_compiled_cache(layer_specs, self.configs)
 
         self.composed_config_dict = {}
+        self._reload_warning = None  # the last reload failure warned about
         for config in self.configs:
             self.composed_config_dict.update(config.get_underlying_dict())
 
     def __getitem__(self, node_class):
-        return self.composed_config_dict[node_class]
+        if self.compiled is None or node_class in self.composed_config_dict:
+            return self.composed_config_dict[node_class]
+        return self.compiled[node_class]
 
     def get(self, key, default=None):
-        return self.composed_config_dict.get(key, default)
+        value = self.composed_config_dict.get(key)
+        if value is None and self.compiled is not None:
+            value = self.compiled.get(key)
+        return default if value is None else value
+
+    def keys(self):
+        if self.compiled is None:
+            return self.composed_config_dict.keys()
+        return set(self.composed_config_dict) | set(self.compiled.keys())
 
     def get_config_names(self):
         names = [config.name for config in self.configs]
@@ -92,25 +235,165 @@ class LabelMakerComposedConfig(object):
         config = [config for config in self.configs if config.name == name][0]
         return config
 
+    def _compose_class(self, node_class):
+        """The winning (last) layer's entry for node_class, or None. The compiled config is not consulted."""
+        for config in reversed(self.configs):
+            if node_class in config.data:
+                return config.data[node_class]
+        return None
+
+    def refresh_changed_layers(self):
+        """Re-read only the layers whose files changed, and re-merge what they touch.
+
+        If layers appeared or disappeared (e.g. the personal config was created),
+        all layers are re-read. Returns the set of node classes whose composed
+        entry changed.
+        """
+        touched = set()
+        previous_compiled = self.compiled
+        if self.compiled is not None:
+            signature = file_signature(self.compiled_path)
+            if signature != self.compiled_signature:
+                self.compiled_signature = signature
+                compiled = open_compiled_config(self.compiled_path)
+                if compiled is not None:
+                    touched.update(self.compiled.keys())
+                    touched.update(compiled.keys())
+                    self.compiled = compiled
+        layer_specs = config_layer_specs(warn=False, shared_layers=self.compiled is None)
+        reload_failed = False
+        if layer_specs != [(config.name, config.path) for config in self.configs]:
+            configs = []
+            for name, path in layer_specs:
+                try:
+                    configs.append(LabelMakerConfig(name=name, path=path))
+                except (IOError, OSError, ValueError) as error:
+                    # probably a new config caught mid-save; keep the old
+                    # layers and retry next poll
+                    self._warn_reload_failed(path, error)
+                    reload_failed = True
+                    break
+            if not reload_failed:
+                for config in self.configs + configs:
+                    touched.update(config.data.keys())
+                self.configs = configs
+        else:
+            for config in self.configs:
+                if file_signature(config.path) == config.signature:
+                    continue
+                touched.update(config.data.keys())
+                try:
+                    config.data = config.load_config()
+                except (IOError, OSError, ValueError) as error:
+                    # probably caught mid-save; keep the old data and retry next poll
+                    self._warn_reload_failed(config.path, error)
+                    reload_failed = True
+                    continue
+                touched.update(config.data.keys())
+        if not reload_failed:
+            self._reload_warning = None
+
+        changed = set()
+        for node_class in touched:
+            previous = self.composed_config_dict.get(node_class)
+            if previous is None and previous_compiled is not None:
+                previous = previous_compiled.get(node_class)
+            layered = self._compose_class(node_class)
+            composed = layered
+            if composed is None and self.compiled is not None:
+                composed = self.compiled.get(node_class)
+            if composed != previous:
+                changed.add(node_class)
+            if layered is None:
+                self.composed_config_dict.pop(node_class, None)
+            else:
+                self.composed_config_dict[node_class] = layered
+        if previous_compiled is not self.compiled:
+            previous_compiled.close()
+        return changed
+
+
+    def _warn_reload_failed(self, path, error):
+        # the watcher retries every poll; only warn when the problem changes
+        message = "Labelmaker: could not reload {}: {}".format(path, error)
+        if message != self._reload_warning:
+            self._reload_warning = message
+            nuke.warning(message)
+
+
+class ConfigWatcher(object):
+    """Poll config files and hot-reload only the layers that changed.
+
+    Listeners are called with the set of node classes whose composed config
+    changed, so only nodes of those classes need relabelling.
+    """
+
+    def __init__(self):
+        super(ConfigWatcher, self).__init__()
+        self._listeners = []
+        self._timer = None  # created lazily on start (PySide6 not imported at module level)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def start(self):
+        interval = int(
+            os.environ.get(CONFIG_WATCH_INTERVAL_ENV_VAR, DEFAULT_CONFIG_WATCH_INTERVAL_MS)
+        )
+        if interval <= 0:
+            return
+        if self._timer is None:
+            from PySide6 import QtCore
+            self._timer = QtCore.QTimer()
+            self._timer.timeout.connect(self.poll)
+        self._timer.setInterval(interval)
+        self._timer.start()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+
+    def poll(self):
+        changed_classes = composed_config_singleton.refresh_changed_layers()
+        if changed_classes:
+            for listener in self._listeners:
+                listener(changed_classes)
+        return changed_classes
+
 
 class LabelMakerConfig(UserDict, object):
     """A single config."""
 
-    def __init__(self, name, path):
+    def __init__(self, name, path, data=None, signature=None):
         super(LabelMakerConfig, self).__init__()
         self.name = name
         self.path = path
-        self.data = self.load_config()
+        if data is None:
+            self.data = self.load_config()
+        else:
+            # already parsed, e.g. from the compiled config cache
+            self.data = data
+            self.signature = signature
+            self.dirty = False
 
     def load_config(self):
+        signature = file_signature(self.path)
         with open(self.path, "r") as f:
             config = json.load(f)
+        self.signature = signature
         self.dirty = False
         return config
 
-    def save_config(self):
-        with open(self.path, "w+") as f:
-            json.dump(self.data, f)
+    def save_config(self, callback=None):
+        """Save in the background; callback(path, error) is called on the main thread when done."""
+
+        def saved(path, error):
+            if error is not None:
+                self.dirty = True
+            if callback is not None:
+                callback(path, error)
+
+        labelmaker_io.writer_singleton.write_json(self.path, self.data, saved)
         self.dirty = False
 
     def get_underlying_dict(self):
@@ -148,3 +431,6 @@ composed_config_singleton = LabelMakerComposedConfig()
 def reload_composed_config():
     global composed_config_singleton
     composed_config_singleton = LabelMakerComposedConfig()
+
+
+config_watcher_singleton = ConfigWatcher()
@@ -1,104 +1,1081 @@
+import bisect
+import collections
+import hashlib
+import heapq
+import os
+import pickle
+import tempfile
+import time
+
 import nuke
+import labelmaker_config
+import labelmaker_viewport
 
 NODES_TO_SKIP = ('BackdropNode', 'Viewer')
 MINIMUM_GAP = 6  # DAG units of breathing room between nodes after de-overlap
+LABEL_LINE_HEIGHT = 12  # approximate DAG height of one label line, for retracting after a shrink
+TOP_LEVEL_CONTEXT = "(top level)"  # context name of the nodes outside any Group in reports
+# Bump when the layout of the saved layout index changes
+LAYOUT_INDEX_VERSION = 1
 
 
-def deoverlap_downstream(source_node):
-    """Push graph descendants of source_node down if they overlap it after a height increase."""
-    nuke.Undo.disable()
+class LayoutTransaction(object):
+    """Snapshot DAG positions, move nodes in pure Python, then commit once.
+
+    Every xpos/ypos/screenWidth/screenHeight/setYpos call crosses into Nuke,
+    and every setYpos may trigger a DAG redraw. A transaction reads each node's
+    bbox at most once, keeps moves in its own cache (so later reads see earlier
+    moves), and only calls setYpos for nodes whose top actually changed, all
+    in commit().
+
+    When undoable is True the commit is wrapped in a single named undo group;
+    otherwise undo is disabled for the commit so automatic layout changes do
+    not pollute the undo stack.
+
+    measure(node) -> (width, height) replaces screenWidth/screenHeight, which
+    are 0 when there is no DAG, e.g. under nuke -t.
+    """
+
+    def __init__(self, undoable=False, undo_name="De-overlap Nodes", measure=None):
+        super(LayoutTransaction, self).__init__()
+        self.undoable = undoable
+        self.undo_name = undo_name
+        self.measure = measure
+        self._nodes = {}          # {node_name: node}
+        self._bboxes = {}         # {node_name: [left, top, right, bottom]}
+        self._original_tops = {}  # {node_name: top when first read}
+        self._started = time.perf_counter()
+        self._committed = None
+        self.moved_count = 0
+        self.read_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def snapshot(self, nodes):
+        """Read the bboxes of many nodes in one pass."""
+        start = time.perf_counter()
+        for node in nodes:
+            self._read(node)
+        self.read_seconds += time.perf_counter() - start
+
+    def _read(self, node):
+        node_name = node.name()
+        bbox = self._bboxes.get(node_name)
+        if bbox is None:
+            x = node.xpos()
+            y = node.ypos()
+            if self.measure is None:
+                bbox = [x, y, x + node.screenWidth(), y + node.screenHeight()]
+            else:
+                width, height = self.measure(node)
+                bbox = [x, y, x + width, y + height]
+            self._nodes[node_name] = node
+            self._bboxes[node_name] = bbox
+            self._original_tops[node_name] = y
+        return bbox
+
+    def bbox(self, node):
+        """Return the node's mutable [left, top, right, bottom], reading it if needed."""
+        bbox = self._bboxes.get(node.name())
+        if bbox is not None:
+            return bbox
+        start = time.perf_counter()
+        bbox = self._read(node)
+        self.read_seconds += time.perf_counter() - start
+        return bbox
+
+    def bboxes(self):
+        """{node_name: [left, top, right, bottom]} for every node read so far."""
+        return self._bboxes
+
+    def move_to(self, node_name, top):
+        """Set the pending top edge of an already-read node."""
+        bbox = self._bboxes[node_name]
+        bbox[3] += top - bbox[1]
+        bbox[1] = top
+
+    def pending_moves(self):
+        """[(node, new_top)] for every node whose top changed since it was read."""
+        return [
+            (self._nodes[node_name], int(bbox[1]))
+            for node_name, bbox in self._bboxes.items()
+            if int(bbox[1]) != self._original_tops[node_name]
+        ]
+
+    def commit(self):
+        """Apply every pending move with setYpos. Returns the number of nodes moved."""
+        commit_transactions([self], self.undoable, self.undo_name)
+        return self.moved_count
+
+    def report(self):
+        """Node counts and per-phase timings, for logging or display."""
+        finished = self._committed if self._committed is not None else time.perf_counter()
+        compute_seconds = finished - self._started - self.read_seconds
+        return {
+            "nodes": len(self._bboxes),
+            "moved": self.moved_count,
+            "read_seconds": self.read_seconds,
+            "compute_seconds": max(compute_seconds, 0.0),
+            "write_seconds": self.write_seconds,
+        }
+
+
+def commit_transactions(transactions, undoable=False, undo_name="De-overlap Nodes"):
+    """Commit several LayoutTransactions at once, as a single undo step if undoable."""
+    committed = time.perf_counter()
+    moves = [transaction.pending_moves() for transaction in transactions]
+    for transaction, changed in zip(transactions, moves):
+        transaction._committed = committed
+        transaction.moved_count = len(changed)
+        transaction.write_seconds = 0.0
+    if not any(moves):
+        return
+    if undoable:
+        undo = nuke.Undo()
+        undo.begin(undo_name)
+    else:
+        nuke.Undo.disable()
     try:
-        _deoverlap_chain(source_node, set())
+        for transaction, changed in zip(transactions, moves):
+            start = time.perf_counter()
+            for node, top in changed:
+                node.setYpos(top)
+            transaction.write_seconds = time.perf_counter() - start
     finally:
-        nuke.Undo.enable()
+        if undoable:
+            undo.end()
+        else:
+            nuke.Undo.enable()
+
+
+class DependencyGraph(object):
+    """Downstream adjacency of the nodes in the current context.
+
+    Built with one pass over nuke.allNodes() instead of calling
+    dependent(nuke.INPUTS) for every visited node. Nodes in NODES_TO_SKIP are
+    never children, so they are neither pushed nor traversed through.
+    """
+
+    def __init__(self, nodes=()):
+        super(DependencyGraph, self).__init__()
+        self.nodes = {}     # {node_name: node}
+        self.children = {}  # {node_name: [child node_name, ...]}
+        self.listed = time.perf_counter()  # when the script's nodes were listed
+        for node in nodes:
+            self.add_node(node)
+        for node_name in self.nodes:
+            self.add_inputs(node_name)
+
+    def add_node(self, node):
+        node_name = node.name()
+        self.nodes[node_name] = node
+        self.children.setdefault(node_name, [])
+
+    def add_inputs(self, node_name):
+        """Connect node_name to its inputs. Call once every node has been added."""
+        node = self.nodes[node_name]
+        if node.Class() in NODES_TO_SKIP:
+            return
+        for input_index in range(node.inputs()):
+            parent = node.input(input_index)
+            if parent is None:
+                continue
+            siblings = self.children.setdefault(parent.name(), [])
+            if node_name not in siblings:
+                siblings.append(node_name)
+
+    @classmethod
+    def from_script(cls):
+        return cls(nuke.allNodes())
+
+    def descendants(self, source_names):
+        """The sources plus everything downstream of them, found iteratively."""
+        found = set()
+        stack = [name for name in source_names if name in self.nodes]
+        while stack:
+            node_name = stack.pop()
+            if node_name in found:
+                continue
+            found.add(node_name)
+            stack.extend(self.children.get(node_name, ()))
+        return found
+
+    def topological_order(self, node_names, priority=None):
+        """Order node_names so every node comes after its parents among them.
+
+        With priority(node_name), of the nodes whose parents are all placed,
+        the one with the lowest priority goes next.
+        """
+        parent_counts = dict.fromkeys(node_names, 0)
+        for node_name in node_names:
+            for child_name in self.children.get(node_name, ()):
+                if child_name in parent_counts:
+                    parent_counts[child_name] += 1
+        if priority is None:
+            ready = sorted(name for name, count in parent_counts.items() if count == 0)
+            take = ready.pop
+            put = ready.append
+        else:
+            ready = [(priority(name), name) for name, count in parent_counts.items() if count == 0]
+            heapq.heapify(ready)
+            take = lambda: heapq.heappop(ready)[1]
+            put = lambda name: heapq.heappush(ready, (priority(name), name))
+        ordered = []
+        while ready:
+            node_name = take()
+            ordered.append(node_name)
+            for child_name in self.children.get(node_name, ()):
+                if child_name in parent_counts:
+                    parent_counts[child_name] -= 1
+                    if parent_counts[child_name] == 0:
+                        put(child_name)
+        if len(ordered) < len(parent_counts):
+            # a cycle (should not happen in a DAG); place the rest in name order
+            placed = set(ordered)
+            ordered.extend(sorted(name for name in parent_counts if name not in placed))
+        return ordered
+
+
+_dependency_graph = None
+# (DependencyGraph, nodes left to add, node names left to connect) while
+# built in slices, next ones last
+_partial_graph = None
+
+# knobChanged reports input connection changes on these pseudo-knobs, and
+# renames on "name"; the graph is keyed by name, so both invalidate it
+GRAPH_KNOB_NAMES = ("inputChange", "inputs", "name")
+
+
+def get_dependency_graph():
+    """The cached DependencyGraph, rebuilt if something invalidated it."""
+    return build_dependency_graph()
+
+
+def build_dependency_graph(deadline=None):
+    """The cached DependencyGraph, rebuilding it if needed until deadline (a perf_counter time).
+
+    Returns None if the deadline passes before the graph is done; the next
+    call carries on where this one stopped. With no deadline it always
+    finishes.
+    """
+    global _dependency_graph, _partial_graph
+    if _dependency_graph is None:
+        if _partial_graph is None:
+            nodes = nuke.allNodes()
+            nodes.reverse()
+            _partial_graph = (DependencyGraph(), nodes, None)
+        graph, nodes, node_names = _partial_graph
+        while nodes:
+            graph.add_node(nodes.pop())
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+        if node_names is None:
+            node_names = list(graph.nodes)
+            node_names.reverse()
+            _partial_graph = (graph, nodes, node_names)
+        while node_names:
+            graph.add_inputs(node_names.pop())
+            if node_names and deadline is not None and time.perf_counter() > deadline:
+                return None
+        _dependency_graph = graph
+        _partial_graph = None
+    return _dependency_graph
+
+
+def invalidate_dependency_graph():
+    global _dependency_graph, _partial_graph
+    _dependency_graph = None
+    _partial_graph = None
+
+
+def _invalidate_on_graph_change():
+    if nuke.thisKnob().name() in GRAPH_KNOB_NAMES:
+        invalidate_dependency_graph()
+
 
+def register_graph_callbacks():
+    """Drop the cached graph whenever nodes, names or connections change."""
+    nuke.addOnCreate(invalidate_dependency_graph)
+    nuke.addOnDestroy(invalidate_dependency_graph)
+    nuke.addKnobChanged(_invalidate_on_graph_change)
+    nuke.addOnScriptLoad(invalidate_dependency_graph)
+    nuke.addOnScriptClose(invalidate_dependency_graph)
 
-def deoverlap_all(undoable=False):
+
+def deoverlap_downstream(source_node):
+    """Push graph descendants of source_node down if they overlap it after a height increase.
+
+    Returns the LayoutTransaction report.
+    """
+    return deoverlap_downstream_many([source_node.name()])
+
+
+def deoverlap_downstream_many(source_names, graph=None):
+    """Push the graph descendants of several source nodes down in one pass.
+
+    Sources and their descendants are visited once, in topological order, so
+    a node reachable from several sources is only placed after all of its
+    parents have been. Uses the cached DependencyGraph unless one is given.
+
+    Returns the LayoutTransaction report.
+    """
+    if graph is None:
+        graph = get_dependency_graph()
+        if any(source_name not in graph.nodes for source_name in source_names):
+            # a source the cached graph has never seen; callbacks were missed
+            invalidate_dependency_graph()
+            graph = get_dependency_graph()
+    transaction = LayoutTransaction()
+    _deoverlap_chain(source_names, graph, transaction)
+    transaction.commit()
+    return transaction.report()
+
+
+class DeoverlapScheduler(object):
+    """Debounce, coalesce and time-box growth-triggered downstream de-overlaps.
+
+    queue() marks a node whose label grew. After a quiet period the pending
+    sources are flushed into one job: everything downstream of any of them,
+    placed in topological order, so a node below several grown sources is
+    only placed once, after all of them. Within that order, nodes nearest
+    the DAG viewport go first. The job is worked through in slices of at
+    most slice_budget seconds on consecutive event-loop ticks, each slice
+    committing its own LayoutTransaction, so thousands of labels growing at
+    once (e.g. after a config change) never freeze the UI. Building the
+    dependency graph, finding the nodes downstream and reading their
+    positions happen in those slices too, and sources flushed into a
+    running job only add their own downstream nodes to it.
+
+    The quiet period grows with the number of pending sources, because a
+    burst of growth tends to keep coming, but no source waits longer than
+    MAX_DELAY_MS before its job starts.
+
+    queue_retract() marks a node whose label shrank. Shrunk nodes are
+    debounced along with grown ones and handled first, as one retract job:
+    the script's positions are read in time-boxed slices too, then the
+    region below the shrunk nodes is swept and committed at once.
+    """
+
+    BASE_DELAY_MS = 150
+    DELAY_PER_PENDING_MS = 1
+    MAX_DELAY_MS = 1000
+    SLICE_BUDGET_SECONDS = 0.02
+    LATENCY_HISTORY_SIZE = 256
+
+    def __init__(self, profiler=None, slice_budget=SLICE_BUDGET_SECONDS):
+        super(DeoverlapScheduler, self).__init__()
+        self.profiler = profiler
+        self.slice_budget = slice_budget
+        self._pending = {}    # {node_name: perf_counter when first queued}
+        self._pending_since = None  # perf_counter when the first of _pending was queued
+        self._pending_retract = {}  # {node_name: label lines lost since the last retract}
+        self._retract_queued = None  # perf_counter when the first of _pending_retract was queued
+        self._retract_job = None  # (LayoutTransaction, shrunk, nodes left to read) of the running retract
+        self._graph = None    # the DependencyGraph the current job is laid out on
+        self._sources = []    # sources flushed into the job but not yet looked downstream of
+        self._walk = []       # node names whose downstream nodes are still to be found, next one last
+        self._members = set()  # node names found so far in the current job, placed or not
+        self._unplaced = set()  # members still to be placed
+        self._parent_counts = {}  # {node_name: unplaced parents in the job}
+        self._ready = []      # heap of (priority, node_name) that may be placeable; others are skipped
+        self._cycle_leftovers = []  # unplaced node names in a cycle, next one last
+        self._priorities = {}  # {node_name: viewport priority}, read once per job
+        self._viewport = None  # the viewport when the current job started
+        self._job_sources = {}  # {node_name: queued at} for sources in the current job
+        self._processed = set()  # node names the current job has already placed
+        self._delay_timer = None  # created lazily on first use (PySide6 not imported at module level)
+        self._slice_timer = None
+        self.jobs = 0
+        self.slices = 0
+        self.nodes_processed = 0
+        self.nodes_moved = 0
+        self.nodes_retracted = 0
+        self.max_queue_depth = 0
+        self._latencies = collections.deque(maxlen=self.LATENCY_HISTORY_SIZE)
+
+    def queue(self, node_name):
+        now = time.perf_counter()
+        self._pending.setdefault(node_name, now)
+        if self._pending_since is None:
+            self._pending_since = now
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+        self._restart_delay(now, self._pending_since)
+
+    def queue_retract(self, node_name, lines_lost):
+        now = time.perf_counter()
+        self._pending_retract[node_name] = self._pending_retract.get(node_name, 0) + lines_lost
+        if self._retract_queued is None:
+            self._retract_queued = now
+        self._restart_delay(now, self._retract_queued)
+
+    def _restart_delay(self, now, oldest):
+        timer = self._get_timers()[0]
+        if timer.isActive() and (now - oldest) * 1000.0 >= self.MAX_DELAY_MS:
+            return  # don't postpone any further; let the timer fire
+        timer.start(self.current_delay_ms())  # restarts timer if already running
+
+    def current_delay_ms(self):
+        return min(
+            self.MAX_DELAY_MS,
+            self.BASE_DELAY_MS + self.DELAY_PER_PENDING_MS * len(self._pending),
+        )
+
+    def _get_timers(self):
+        if self._delay_timer is None:
+            from PySide6 import QtCore
+            self._delay_timer = QtCore.QTimer()
+            self._delay_timer.setSingleShot(True)
+            self._delay_timer.timeout.connect(self.flush)
+            self._slice_timer = QtCore.QTimer()
+            self._slice_timer.setSingleShot(True)
+            self._slice_timer.setInterval(0)
+            self._slice_timer.timeout.connect(self._run_slice)
+        return self._delay_timer, self._slice_timer
+
+    def flush(self):
+        """Start retracting below shrunk nodes, fold pending sources into the current job and run the first slice."""
+        self._start_retract()
+        self._absorb_pending()
+        self._run_slice()
+
+    def _start_retract(self):
+        # shrinks queued while a retract is running wait for it to finish,
+        # since some of their bboxes may already have been read
+        if not self._pending_retract or self._retract_job is not None:
+            return
+        shrunk = {
+            node_name: lines_lost * LABEL_LINE_HEIGHT
+            for node_name, lines_lost in self._pending_retract.items()
+        }
+        self._pending_retract = {}
+        self._retract_queued = None
+        nodes = retract_candidates()
+        nodes.reverse()
+        self._retract_job = (LayoutTransaction(undo_name="Retract Nodes"), shrunk, nodes)
+
+    def run_retract_slice(self, budget=None):
+        """Read positions for the running retract for up to budget seconds (None: to the end), then finish it."""
+        budget = self.slice_budget if budget is None else budget
+        transaction, shrunk, nodes = self._retract_job
+        deadline = time.perf_counter() + budget
+        while nodes:
+            try:
+                transaction.snapshot([nodes.pop()])
+            except ValueError:
+                # deleted since the retract started
+                pass
+            if time.perf_counter() > deadline:
+                self.slices += 1
+                return
+        self._retract_job = None
+        self.slices += 1
+        self.nodes_retracted += finish_retract(transaction, shrunk)["moved"]
+        self._start_retract()
+
+    @property
+    def job_running(self):
+        return bool(self._sources or self._walk or self._unplaced)
+
+    def _absorb_pending(self):
+        # only bookkeeping; the new sources' downstream nodes are found in the
+        # job's slices
+        if not self._pending:
+            return
+        if not self.job_running:
+            self.jobs += 1
+            self._viewport = labelmaker_viewport.Viewport.current()
+        self._job_sources.update(self._pending)
+        self._sources.extend(self._pending)
+        self._pending = {}
+        self._pending_since = None
+
+    def _run_slice(self):
+        if self._retract_job is not None:
+            slice_function, stage = self.run_retract_slice, "retract_slice"
+        elif self.job_running:
+            slice_function, stage = self.run_slice, "deoverlap_slice"
+        else:
+            return
+        if self.profiler is not None:
+            self.profiler.time_call("*", stage, slice_function)
+        else:
+            slice_function()
+        if self._retract_job is not None or self.job_running:
+            self._get_timers()[1].start()
+
+    def run_slice(self, budget=None):
+        """Work on the current job for up to budget seconds (None: slice_budget)."""
+        budget = self.slice_budget if budget is None else budget
+        deadline = time.perf_counter() + budget
+        self.slices += 1
+        graph = build_dependency_graph(deadline)
+        if graph is None:
+            return
+        if graph is not self._graph:
+            self._restart(graph)
+        if not self._take_sources(graph):
+            # the graph is being rebuilt; carry on next slice
+            return
+        # the order isn't known until every node downstream has been found
+        if not self._find_downstream(graph, deadline):
+            return
+        transaction = LayoutTransaction()
+        processed = 0
+        requeue = []
+        while self._unplaced:
+            node_name = self._next_placeable()
+            try:
+                moved = _push_children(node_name, graph, transaction)
+            except (ValueError, KeyError):
+                # a node was deleted or renamed; the graph will be rebuilt on
+                # the next slice
+                moved = ()
+            self._processed.add(node_name)
+            for child_name in graph.children.get(node_name, ()):
+                parent_count = self._parent_counts.get(child_name, 0)
+                if child_name in self._unplaced and parent_count:
+                    self._parent_counts[child_name] = parent_count - 1
+                    if parent_count == 1:
+                        self._make_ready(child_name)
+            requeue.extend(name for name in moved if name in self._processed)
+            processed += 1
+            if time.perf_counter() > deadline:
+                break
+        # placed before a source merged into the job pushed them further
+        for node_name in requeue:
+            self._unplace(graph, node_name)
+        transaction.commit()
+        self.nodes_processed += processed
+        self.nodes_moved += transaction.moved_count
+        if not self.job_running:
+            finished = time.perf_counter()
+            self._latencies.extend(finished - queued for queued in self._job_sources.values())
+            self._job_sources = {}
+            self._processed = set()
+            self._members = set()
+            self._parent_counts = {}
+            self._ready = []
+            self._cycle_leftovers = []
+            self._priorities = {}
+
+    def _restart(self, graph):
+        # nodes or connections changed since the job started; find what's
+        # left again on the new graph
+        self._graph = graph
+        self._walk = [name for name in self._unplaced if name in graph.nodes]
+        self._members = set()
+        self._unplaced = set()
+        self._parent_counts = {}
+        self._ready = []
+        self._cycle_leftovers = []
+
+    def _take_sources(self, graph):
+        """Add the flushed sources to the job. False if the graph had to be invalidated."""
+        if any(
+            source_name not in graph.nodes and self._job_sources[source_name] > graph.listed
+            for source_name in self._sources
+        ):
+            # a source queued since the graph was built that it doesn't have;
+            # callbacks were missed
+            invalidate_dependency_graph()
+            return False
+        for source_name in self._sources:
+            if source_name not in graph.nodes:
+                continue
+            if source_name in self._processed:
+                # it grew again, so it is placed again; nodes below it that
+                # were placed are requeued if it pushes them
+                self._unplace(graph, source_name)
+            elif source_name not in self._members:
+                self._walk.append(source_name)
+        self._sources = []
+        return True
+
+    def _find_downstream(self, graph, deadline):
+        """Add what's downstream of the walk to the job until deadline. True when done."""
+        while self._walk:
+            node_name = self._walk.pop()
+            if node_name in self._members or node_name not in graph.nodes:
+                continue
+            self._members.add(node_name)
+            self._walk.extend(graph.children.get(node_name, ()))
+            if node_name not in self._processed:
+                self._unplace(graph, node_name)
+            if self._walk and time.perf_counter() > deadline:
+                return False
+        return True
+
+    def _unplace(self, graph, node_name):
+        # node_name is to be placed (again); its children wait for it
+        self._processed.discard(node_name)
+        self._members.add(node_name)
+        self._unplaced.add(node_name)
+        for child_name in graph.children.get(node_name, ()):
+            if child_name not in self._processed:
+                self._parent_counts[child_name] = self._parent_counts.get(child_name, 0) + 1
+        if not self._parent_counts.get(node_name):
+            self._make_ready(node_name)
+
+    def _make_ready(self, node_name):
+        priority = self._priorities.get(node_name)
+        if priority is None:
+            # nearest the viewport first, as far as parents-before-children allows
+            priority = self._priorities[node_name] = self._viewport.priority(
+                labelmaker_viewport.node_position(self._graph.nodes[node_name])
+            )
+        heapq.heappush(self._ready, (priority, node_name))
+
+    def _next_placeable(self):
+        while not self._cycle_leftovers and self._ready:
+            node_name = heapq.heappop(self._ready)[1]
+            # entries go stale when their node is placed or gains a parent
+            if node_name in self._unplaced and not self._parent_counts.get(node_name):
+                self._unplaced.discard(node_name)
+                return node_name
+        if not self._cycle_leftovers:
+            # a cycle (should not happen in a DAG); place the rest in name order
+            self._cycle_leftovers = sorted(self._unplaced, reverse=True)
+        node_name = self._cycle_leftovers.pop()
+        while node_name not in self._unplaced:
+            node_name = self._cycle_leftovers.pop()
+        self._unplaced.discard(node_name)
+        return node_name
+
+    def run_pending(self):
+        """Flush and finish everything synchronously, e.g. outside the GUI."""
+        self._start_retract()
+        while self._retract_job is not None:
+            self.run_retract_slice(budget=float("inf"))
+        self._absorb_pending()
+        while self.job_running:
+            self.run_slice(budget=float("inf"))
+
+    def metrics(self):
+        """Queue depth, progress and source-to-done latency, for display or logging."""
+        latencies = sorted(self._latencies)
+        return {
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self.max_queue_depth,
+            "job_remaining": len(self._unplaced) + len(self._walk),
+            "jobs": self.jobs,
+            "slices": self.slices,
+            "nodes_processed": self.nodes_processed,
+            "nodes_moved": self.nodes_moved,
+            "nodes_retracted": self.nodes_retracted,
+            "current_delay_ms": self.current_delay_ms(),
+            "latency_p50_ms": latencies[len(latencies) // 2] * 1000.0 if latencies else 0.0,
+            "latency_max_ms": latencies[-1] * 1000.0 if latencies else 0.0,
+        }
+
+
+def deoverlap_all(undoable=False, recursive=False, measure=None, incremental=False, retract=False):
     """De-overlap all nodes in the script using a ypos-sorted spatial sweep.
 
     Sorts all nodes top-to-bottom, then for each node finds the maximum bottom
     edge among all preceding nodes that overlap it horizontally, and pushes the
     node down if needed. This handles disconnected clusters naturally because it
-    uses spatial position rather than graph topology.
+    uses spatial position rather than graph topology. The maximum bottom edge
+    is looked up in a _Skyline over the x axis, so the sweep is O(n log n).
+
+    All positions are read up front and written back in one LayoutTransaction
+    commit, so only nodes that actually moved are touched.
 
-    When undoable is True, undo is left enabled so repositioning is tracked
-    by Nuke's undo system. When False (the default, used for automatic
-    label-change triggers) undo is disabled so the undo stack is not polluted.
+    When recursive is True, the inside of every Group (at any depth) is laid
+    out too, each Group independently of the others, and all of them are
+    committed together.
+
+    When undoable is True, the moves form a single undo step. When False (the
+    default, used for automatic label-change triggers) undo is disabled so the
+    undo stack is not polluted.
+
+    measure is passed on to each LayoutTransaction.
+
+    When incremental is True, the settled positions from the last run are
+    looked up in the script's LayoutIndex, and only the region that changed
+    since is swept again (see _dirty_region). The result is the same as a
+    full sweep. Positions are still read for every node, to find what changed.
+
+    When retract is True, the sweep also pulls nodes up to close gaps wider
+    than MINIMUM_GAP below the nodes above them (see _sweep). This always
+    sweeps everything, but still updates the index if incremental is True.
+
+    Returns the combined report, with a per-context breakdown under "contexts".
     """
-    if not undoable:
-        nuke.Undo.disable()
-    try:
-        all_nodes = [n for n in nuke.allNodes() if n.Class() not in NODES_TO_SKIP]
-        if not all_nodes:
+    contexts = layout_contexts(recursive)
+    transactions = []
+    for _, nodes in contexts:
+        transaction = LayoutTransaction(undoable=undoable, measure=measure)
+        transaction.snapshot([n for n in nodes if n.Class() not in NODES_TO_SKIP])
+        transactions.append(transaction)
+
+    start = time.perf_counter()
+    index = get_layout_index() if incremental else None
+    sweeps = []  # [(position_cache, obstacles, retract)]
+    for (context_name, _), transaction in zip(contexts, transactions):
+        if index is None or retract:
+            sweeps.append((transaction.bboxes(), None, retract))
+        else:
+            sweeps.append(_dirty_region(index.settled(context_name), transaction.bboxes()) + (False,))
+    sweep_seconds = [_timed_sweep(*sweep) for sweep in sweeps]
+    compute_seconds = time.perf_counter() - start
+
+    commit_transactions(transactions, undoable)
+    if index is not None:
+        for (context_name, _), transaction in zip(contexts, transactions):
+            index.record(context_name, transaction.bboxes())
+        index.save()
+
+    context_reports = []
+    for (context_name, _), transaction, seconds, sweep in zip(contexts, transactions, sweep_seconds, sweeps):
+        context_report = transaction.report()
+        context_report["context"] = context_name
+        context_report["compute_seconds"] = seconds
+        context_report["swept"] = len(sweep[0])
+        context_reports.append(context_report)
+    return {
+        "nodes": sum(report["nodes"] for report in context_reports),
+        "swept": sum(report["swept"] for report in context_reports),
+        "moved": sum(report["moved"] for report in context_reports),
+        "read_seconds": sum(report["read_seconds"] for report in context_reports),
+        "compute_seconds": compute_seconds,
+        "write_seconds": sum(report["write_seconds"] for report in context_reports),
+        "contexts": context_reports,
+    }
+
+
+def layout_contexts(recursive=False):
+    """[(context name, nodes)] for the current context and, if recursive, every Group inside it.
+
+    The current context is named TOP_LEVEL_CONTEXT; Groups by their fullName.
+    Gizmos are not entered, since their insides are not meant to be edited.
+    """
+    contexts = []
+    pending = [(TOP_LEVEL_CONTEXT, None)]
+    while pending:
+        context_name, group = pending.pop()
+        nodes = nuke.allNodes() if group is None else nuke.allNodes(group=group)
+        contexts.append((context_name, nodes))
+        if recursive:
+            pending.extend(
+                (node.fullName(), node) for node in reversed(nodes) if node.Class() == "Group"
+            )
+    return contexts
+
+
+def format_report(report):
+    """A human-readable summary of a deoverlap_all report, slowest contexts first."""
+    lines = ["Moved {} of {} nodes, {} swept (read {:.3f}s, compute {:.3f}s, write {:.3f}s)".format(
+        report["moved"],
+        report["nodes"],
+        report["swept"],
+        report["read_seconds"],
+        report["compute_seconds"],
+        report["write_seconds"],
+    )]
+    contexts = sorted(
+        report.get("contexts", ()),
+        key=lambda context: context["read_seconds"] + context["compute_seconds"] + context["write_seconds"],
+        reverse=True,
+    )
+    for context in contexts:
+        lines.append("  {:<40} {:>6} nodes {:>6} moved  {:.4f}s read  {:.4f}s compute  {:.4f}s write".format(
+            context["context"],
+            context["nodes"],
+            context["moved"],
+            context["read_seconds"],
+            context["compute_seconds"],
+            context["write_seconds"],
+        ))
+    return "\n".join(lines)
+
+
+def deoverlap_all_groups():
+    """Menu command: undoably de-overlap the script and every Group in it, printing timings."""
+    print(format_report(deoverlap_all(undoable=True, recursive=True, incremental=True)))
+
+
+def compact_all():
+    """Menu command: undoably close up the vertical gaps in the script, then de-overlap it."""
+    return deoverlap_all(undoable=True, incremental=True, retract=True)
+
+
+def retract_below(shrunk, undoable=False, undo_name="Retract Nodes"):
+    """Pull the nodes below shrunk ({node_name: DAG units its label shrank by}) up into the freed room.
+
+    Only the x-bands below the shrunk nodes are swept, and gaps that were
+    there before the shrink are kept. Returns the transaction report.
+    """
+    transaction = LayoutTransaction(undoable=undoable, undo_name=undo_name)
+    transaction.snapshot(retract_candidates())
+    return finish_retract(transaction, shrunk)
+
+
+def retract_candidates():
+    """The nodes in the current context a retract may move or have to avoid."""
+    return [n for n in nuke.allNodes() if n.Class() not in NODES_TO_SKIP]
+
+
+def finish_retract(transaction, shrunk):
+    """Retract below shrunk within the nodes transaction has read, and commit it. Returns its report."""
+    bboxes = transaction.bboxes()
+    seeds = set(name for name in shrunk if name in bboxes)
+    if seeds:
+        position_cache, obstacles = _region_below(bboxes, seeds, sweep_seeds=False)
+        _sweep(position_cache, obstacles, retract=True, shrunk=shrunk)
+    transaction.commit()
+    return transaction.report()
+
+
+def _layout_index_path(script_name):
+    script_digest = hashlib.sha1(script_name.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(labelmaker_config.cache_dir(), "layout_index_{}.pickle".format(script_digest))
+
+
+class LayoutIndex(object):
+    """The settled bboxes of every layout context as of the last deoverlap_all.
+
+    Saved as a pickle under labelmaker_config.cache_dir(), keyed by script
+    path, so it survives reopening the script. Unsaved scripts are only
+    indexed in memory.
+    """
+
+    def __init__(self, script_name):
+        super(LayoutIndex, self).__init__()
+        self.script_name = script_name
+        self._contexts = {}  # {context name: {node_name: (left, top, right, bottom)}}
+
+    @classmethod
+    def load(cls, script_name):
+        index = cls(script_name)
+        if script_name is None:
+            return index
+        try:
+            with open(_layout_index_path(script_name), "rb") as f:
+                saved = pickle.load(f)
+        except Exception:
+            # missing, truncated or from an incompatible Python; start afresh
+            return index
+        if (
+            isinstance(saved, dict)
+            and saved.get("version") == LAYOUT_INDEX_VERSION
+            and saved.get("gap") == MINIMUM_GAP
+            and saved.get("script") == script_name
+        ):
+            index._contexts = saved["contexts"]
+        return index
+
+    def settled(self, context_name):
+        """{node_name: bbox tuple} from the last run, or None if the context was never laid out."""
+        return self._contexts.get(context_name)
+
+    def record(self, context_name, bboxes):
+        self._contexts[context_name] = {name: tuple(bbox) for name, bbox in bboxes.items()}
+
+    def save(self):
+        """Write the index out atomically. Failures are ignored; it's only a cache."""
+        if self.script_name is None:
             return
+        index_path = _layout_index_path(self.script_name)
+        saved = {
+            "version": LAYOUT_INDEX_VERSION,
+            "gap": MINIMUM_GAP,
+            "script": self.script_name,
+            "contexts": self._contexts,
+        }
+        try:
+            if not os.path.isdir(os.path.dirname(index_path)):
+                os.makedirs(os.path.dirname(index_path))
+            file_descriptor, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(index_path), suffix=".tmp"
+            )
+            with os.fdopen(file_descriptor, "wb") as f:
+                pickle.dump(saved, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, index_path)
+        except (IOError, OSError, pickle.PicklingError):
+            pass
 
-        # Read all node positions once upfront. Store as mutable lists so
-        # in-flight pushes update the cache without re-reading from Nuke.
-        # Layout: [left, top, right, bottom]
-        position_cache = {}
-        for node in all_nodes:
-            x = node.xpos()
-            y = node.ypos()
-            position_cache[node.name()] = [x, y, x + node.screenWidth(), y + node.screenHeight()]
 
-        # Sort top-to-bottom; use name as tiebreaker for determinism.
-        sorted_nodes = sorted(
-            all_nodes,
-            key=lambda node: (position_cache[node.name()][1], node.name())
-        )
+_layout_indexes = {}  # {script name: LayoutIndex}, None for an unsaved script
 
-        for node_index, node in enumerate(sorted_nodes):
-            node_name = node.name()
-            node_bbox = position_cache[node_name]
 
-            # Find the maximum bottom edge among all preceding nodes that
-            # overlap this node horizontally.
-            max_predecessor_bottom = None
-            for predecessor in sorted_nodes[:node_index]:
-                predecessor_bbox = position_cache[predecessor.name()]
-                if _bboxes_overlap_horizontally(node_bbox, predecessor_bbox):
-                    if max_predecessor_bottom is None or predecessor_bbox[3] > max_predecessor_bottom:
-                        max_predecessor_bottom = predecessor_bbox[3]
+def get_layout_index():
+    """The LayoutIndex of the open script, loaded on first use."""
+    script_name = nuke.root().name()
+    if script_name == "Root":
+        script_name = None  # never saved
+    index = _layout_indexes.get(script_name)
+    if index is None:
+        index = _layout_indexes[script_name] = LayoutIndex.load(script_name)
+    return index
 
-            if max_predecessor_bottom is None:
-                continue
 
+def _dirty_region(settled, bboxes):
+    """Split bboxes into (position_cache to sweep, obstacle bboxes) given the settled bboxes.
+
+    Dirty nodes are those added, moved or resized since settled was
+    recorded; removed nodes can't cause overlaps, as the sweep only pushes
+    down. Only the region below the dirty nodes that they can affect is
+    swept again (see _region_below). This gives the same positions as a full
+    sweep.
+    """
+    if settled is None:
+        return bboxes, None
+    dirty = set(name for name, bbox in bboxes.items() if settled.get(name) != tuple(bbox))
+    if not dirty:
+        return {}, None
+    return _region_below(bboxes, dirty)
+
+
+def _region_below(bboxes, seeds, sweep_seeds=True):
+    """(position_cache, obstacles) for sweeping only what the seed nodes can affect.
+
+    Going down from the highest seed, a node can only be moved if it
+    x-overlaps a seed or a node already found to be affected, so the
+    affected nodes form x-bands growing downwards from the seeds. The seeds
+    are affected themselves if sweep_seeds is True, and otherwise only when
+    a band above reaches them. The obstacles are the unaffected nodes that
+    overlap the bands, to build the skyline from.
+    """
+    y_min = min(bboxes[name][1] for name in seeds)
+    below = sorted(
+        (name for name, bbox in bboxes.items() if bbox[1] >= y_min),
+        key=lambda name: (bboxes[name][1], name),
+    )
+    bands = _Bands()
+    position_cache = {}
+    for name in below:
+        bbox = bboxes[name]
+        if bands.overlaps(bbox[0], bbox[2]) or (sweep_seeds and name in seeds):
+            position_cache[name] = bbox
+        elif name not in seeds:
+            continue
+        bands.add(bbox[0], bbox[2])
+
+    # no unaffected node overlaps an affected one above it, or it would be
+    # affected too, so they can all go into the skyline up front
+    obstacles = {
+        name: bbox for name, bbox in bboxes.items()
+        if name not in position_cache and bands.overlaps(bbox[0], bbox[2])
+    }
+    return position_cache, obstacles
+
+
+class _Bands(object):
+    """A union of x-ranges, as sorted disjoint [left, right] pairs. Touching ranges overlap."""
+
+    def __init__(self):
+        self._lefts = []
+        self._rights = []
+
+    def overlaps(self, left, right):
+        index = bisect.bisect_right(self._lefts, right) - 1
+        return index >= 0 and self._rights[index] >= left
+
+    def add(self, left, right):
+        # merge with every band from the first that reaches left to the last that starts by right
+        low = bisect.bisect_left(self._rights, left)
+        high = bisect.bisect_right(self._lefts, right)
+        if low < high:
+            left = min(left, self._lefts[low])
+            right = max(right, self._rights[high - 1])
+        self._lefts[low:high] = [left]
+        self._rights[low:high] = [right]
+
+
+def _timed_sweep(position_cache, obstacles=None, retract=False):
+    start = time.perf_counter()
+    _sweep(position_cache, obstacles, retract)
+    return time.perf_counter() - start
+
+
+def _sweep(position_cache, obstacles=None, retract=False, shrunk=None):
+    """Push bboxes in position_cache ({name: [left, top, right, bottom]}) down in place.
+
+    obstacles ({name: bbox}) stay put; none of them may be below a bbox in
+    position_cache that it overlaps horizontally.
+
+    With retract, a node more than MINIMUM_GAP below the nodes above it is
+    also pulled up to MINIMUM_GAP below them. It never passes a node above
+    it, so order and x positions are kept. If shrunk ({name: how much shorter
+    its bbox got}) is given, only nodes that were resting MINIMUM_GAP below
+    the nodes above before the shrink are pulled up, which cascades down to
+    whatever rests on them, and other gaps are left alone. Otherwise every
+    gap closes.
+    """
+    if not position_cache:
+        return
+    obstacles = obstacles or {}
+
+    # Sort top-to-bottom; use name as tiebreaker for determinism.
+    sorted_names = sorted(
+        position_cache,
+        key=lambda node_name: (position_cache[node_name][1], node_name)
+    )
+
+    skyline = _Skyline(list(position_cache.values()) + list(obstacles.values()))
+    for bbox in obstacles.values():
+        skyline.add(bbox[0], bbox[2], bbox[3])
+    # where everything was before the shrink, to see which nodes were resting on which
+    previous_skyline = None
+    if retract and shrunk is not None:
+        previous_skyline = _Skyline(list(position_cache.values()) + list(obstacles.values()))
+        for name, bbox in obstacles.items():
+            previous_skyline.add(bbox[0], bbox[2], bbox[3] + shrunk.get(name, 0))
+
+    for node_name in sorted_names:
+        node_bbox = position_cache[node_name]
+        if previous_skyline is not None:
+            previous_bottom = node_bbox[3] + shrunk.get(node_name, 0)
+            previous_bottom_above = previous_skyline.max_bottom(node_bbox[0], node_bbox[2])
+
+        # Find the maximum bottom edge among all preceding nodes that
+        # overlap this node horizontally.
+        max_predecessor_bottom = skyline.max_bottom(node_bbox[0], node_bbox[2])
+
+        if max_predecessor_bottom is not None:
             required_top = max_predecessor_bottom + MINIMUM_GAP
             if required_top > node_bbox[1]:
                 push_amount = required_top - node_bbox[1]
                 node_bbox[1] += push_amount
                 node_bbox[3] += push_amount
-                node.setYpos(int(node_bbox[1]))
+            elif retract and required_top < node_bbox[1] and (
+                previous_skyline is None
+                or previous_bottom_above is not None
+                and node_bbox[1] <= previous_bottom_above + MINIMUM_GAP
+            ):
+                # with shrunk, only nodes that were resting on the ones above follow them up
+                node_bbox[3] -= node_bbox[1] - required_top
+                node_bbox[1] = required_top
 
-    finally:
-        if not undoable:
-            nuke.Undo.enable()
+        # This node is final now, so it is an obstacle for everything below
+        skyline.add(node_bbox[0], node_bbox[2], node_bbox[3])
+        if previous_skyline is not None:
+            previous_skyline.add(node_bbox[0], node_bbox[2], previous_bottom)
 
 
-def _deoverlap_chain(node, visited):
-    if node.name() in visited:
-        return
-    visited.add(node.name())
-    source_bbox = _node_bbox(node)
-    for downstream_node in node.dependent(nuke.INPUTS):
-        if downstream_node.Class() in NODES_TO_SKIP:
-            continue
-        down_bbox = _node_bbox(downstream_node)
+def _deoverlap_chain(source_names, graph, transaction):
+    for node_name in graph.topological_order(graph.descendants(source_names)):
+        _push_children(node_name, graph, transaction)
+
+
+def _push_children(node_name, graph, transaction):
+    """Push node_name's children down below it, if they overlap it from below.
+
+    Returns the names of the children that moved.
+    """
+    source_bbox = transaction.bbox(graph.nodes[node_name])
+    moved = []
+    for downstream_name in graph.children[node_name]:
+        downstream_node = graph.nodes[downstream_name]
+        down_bbox = transaction.bbox(downstream_node)
         # Only consider nodes physically below the source to avoid pushing sideways branches
         if down_bbox[1] <= source_bbox[1]:
             continue
         if _bboxes_overlap(source_bbox, down_bbox):
-            push_amount = source_bbox[3] - down_bbox[1] + MINIMUM_GAP
-            downstream_node.setYpos(downstream_node.ypos() + push_amount)
-        # Always recurse in case this node now overlaps its own descendants
-        _deoverlap_chain(downstream_node, visited)
-
-
-def _node_bbox(node):
-    """Return bounding box in DAG node coordinates (same units as xpos/ypos)."""
-    x = node.xpos()
-    y = node.ypos()
-    return (x, y, x + node.screenWidth(), y + node.screenHeight())
+            # the transaction keys bboxes by current name, which may differ
+            # from the graph's if the node was renamed since it was built
+            transaction.move_to(downstream_node.name(), source_bbox[3] + MINIMUM_GAP)
+            moved.append(downstream_name)
+    return moved
 
 
 def _bboxes_overlap(bbox_a, bbox_b):
@@ -111,3 +1088,128 @@ def _bboxes_overlap(bbox_a, bbox_b):
 def _bboxes_overlap_horizontally(bbox_a, bbox_b):
     """True if the X ranges of two bboxes intersect (touching edges excluded)."""
     return bbox_a[2] > bbox_b[0] and bbox_a[0] < bbox_b[2]
+
+
+class _Skyline(object):
+    """Maximum bottom edge over x-ranges, for the top-to-bottom sweep.
+
+    Answers "what is the lowest bottom edge among the added bboxes that
+    overlap this x-range horizontally?" in O(log n), using the same overlap
+    rule as _bboxes_overlap_horizontally (touching edges excluded).
+
+    X extents are mapped onto doubled integer cells: an extent (left, right)
+    covers cells 2*left+1 .. 2*right-1, i.e. everything strictly between its
+    edges. A zero-width extent can still overlap wider ones, so it is kept as
+    the single cell 2*left, in a separate tree that zero-width queries skip,
+    because two zero-width extents never overlap.
+
+    Both trees are bottom-up segment trees with "raise to at least" updates,
+    which never need to be pushed down because values only ever increase.
+    """
+
+    def __init__(self, bboxes):
+        cells = set()
+        for bbox in bboxes:
+            low, high = self._cell_range(bbox[0], bbox[2])
+            cells.add(low)
+            cells.add(high)
+        self._cell_index = {cell: index for index, cell in enumerate(sorted(cells))}
+        self._size = 1
+        while self._size < len(self._cell_index):
+            self._size *= 2
+        self._wide_tree = self._new_tree()
+        self._point_tree = None  # created on the first zero-width extent
+
+    @staticmethod
+    def _cell_range(left, right):
+        if right > left:
+            return 2 * left + 1, 2 * right - 1
+        return 2 * left, 2 * left
+
+    def _new_tree(self):
+        # [subtree maximum, value applied to the whole segment]
+        return [[None] * (2 * self._size), [None] * (2 * self._size)]
+
+    def add(self, left, right, bottom):
+        low, high = self._cell_range(left, right)
+        if right > left:
+            tree = self._wide_tree
+        else:
+            if self._point_tree is None:
+                self._point_tree = self._new_tree()
+            tree = self._point_tree
+        self._raise(tree, self._cell_index[low], self._cell_index[high], bottom)
+
+    def max_bottom(self, left, right):
+        """Max bottom among added extents overlapping (left, right), or None."""
+        low, high = self._cell_range(left, right)
+        low = self._cell_index[low]
+        high = self._cell_index[high]
+        result = self._query(self._wide_tree, low, high)
+        if right > left and self._point_tree is not None:
+            point_result = self._query(self._point_tree, low, high)
+            if result is None or (point_result is not None and point_result > result):
+                result = point_result
+        return result
+
+    def _raise(self, tree, low, high, value):
+        maxima, applied = tree
+        low_leaf = low + self._size
+        high_leaf = high + self._size
+        start = low_leaf
+        stop = high_leaf + 1
+        while start < stop:
+            if start & 1:
+                _raise_slot(maxima, start, value)
+                _raise_slot(applied, start, value)
+                start += 1
+            if stop & 1:
+                stop -= 1
+                _raise_slot(maxima, stop, value)
+                _raise_slot(applied, stop, value)
+            start >>= 1
+            stop >>= 1
+        # every ancestor of the boundary leaves now contains a raised cell
+        for leaf in (low_leaf, high_leaf):
+            index = leaf >> 1
+            while index:
+                _raise_slot(maxima, index, value)
+                index >>= 1
+
+    def _query(self, tree, low, high):
+        maxima, applied = tree
+        low_leaf = low + self._size
+        high_leaf = high + self._size
+        result = None
+        start = low_leaf
+        stop = high_leaf + 1
+        while start < stop:
+            if start & 1:
+                result = _max_or_none(result, maxima[start])
+                start += 1
+            if stop & 1:
+                stop -= 1
+                result = _max_or_none(result, maxima[stop])
+            start >>= 1
+            stop >>= 1
+        # values applied to whole segments above the covering nodes
+        for leaf in (low_leaf, high_leaf):
+            index = leaf >> 1
+            while index:
+                result = _max_or_none(result, applied[index])
+                index >>= 1
+        return result
+
+
+def _raise_slot(values, index, value):
+    current = values[index]
+    if current is None or value > current:
+        values[index] = value
+
+
+def _max_or_none(current, value):
+    if value is None:
+        return current
+    if current is None or value > current:
+        return value
+    return current
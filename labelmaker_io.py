@@ -0,0 +1,137 @@
+"""Save files off the main thread, atomically.
+
+Prefs and configs live in the home directory, which at many facilities is an
+NFS mount that can take seconds to answer. Writing them on the main thread
+froze Nuke's UI for that long, and a crash part way through a write left a
+truncated file that broke the next startup.
+
+AsyncWriter writes on a background thread instead. Each file is written to a
+temporary file next to it and renamed over it, so it's always either the old
+version or the new one. Saves of a file that arrive while an earlier one is
+still waiting replace it, so only the latest content is written. Anything
+still pending is written before Nuke exits.
+
+Callbacks are called with (path, error), error being None on success, on
+Nuke's main thread, so they may touch the UI. Failures are also reported with
+nuke.warning, from the main thread too, since the Nuke API isn't thread-safe.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+
+import nuke
+
+# how long Nuke waits on exit for pending saves, e.g. to a hung NFS home
+EXIT_FLUSH_TIMEOUT_SECONDS = 5.0
+
+
+def write_atomic(path, text):
+    """Replace the file at path with text, never leaving it half-written.
+
+    If path is a symlink, the file it points to is replaced, not the link.
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp makes the file private; keep the permissions the file had
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class AsyncWriter(object):
+    def __init__(self):
+        super(AsyncWriter, self).__init__()
+        self._condition = threading.Condition()
+        self._pending = {}  # {path: (text, [callback, ...])}, in the order first queued
+        self._writing = False
+        self._thread = None  # started on first write, and again if it ever died
+
+    def write(self, path, text, callback=None):
+        """Queue text to be written to path; callback(path, error) is called when done."""
+        with self._condition:
+            callbacks = self._pending.pop(path, (None, []))[1]
+            if callback is not None:
+                callbacks.append(callback)
+            self._pending[path] = (text, callbacks)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="LabelmakerWriter")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def write_json(self, path, data, callback=None, **dump_kwargs):
+        """Queue data to be written to path as JSON.
+
+        data is serialised now, so callers may keep changing it.
+        """
+        self.write(path, json.dumps(data, **dump_kwargs), callback)
+
+    @property
+    def busy(self):
+        with self._condition:
+            return bool(self._pending) or self._writing
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._writing, timeout
+            )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                path = next(iter(self._pending))
+                text, callbacks = self._pending.pop(path)
+                self._writing = True
+            try:
+                self._write(path, text, callbacks)
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write(self, path, text, callbacks):
+        error = None
+        try:
+            write_atomic(path, text)
+        except Exception as write_error:
+            error = write_error
+            _call_in_main_thread(_warn_save_failed, path, error)
+        for callback in callbacks:
+            _call_in_main_thread(callback, path, error)
+
+
+def _warn_save_failed(path, error):
+    nuke.warning("Labelmaker: couldn't save {}: {}".format(path, error))
+
+
+def _call_in_main_thread(callback, path, error):
+    try:
+        nuke.executeInMainThread(callback, (path, error))
+    except RuntimeError:
+        # no main thread event loop to hand it to, e.g. while Nuke is exiting
+        callback(path, error)
+
+
+writer_singleton = AsyncWriter()
+atexit.register(writer_singleton.flush, EXIT_FLUSH_TIMEOUT_SECONDS)
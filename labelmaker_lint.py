@@ -0,0 +1,215 @@
+"""Check configs against the knobs node classes actually have.
+
+Each config class is instantiated once as a throwaway node, and every entry
+is checked against that node's knobs:
+
+- knobs that don't exist on the class (the autolabel would otherwise try,
+  and fail, to read them on every redraw)
+- malformed entries: missing "name"/"tcl_string", unknown keys, wrongly
+  typed values, and defaults whose shape can never match the knob's value
+  (e.g. a scalar default for translate), which make the line always show
+
+The knob sets found are handed to labelmaker_plan. Once a real node of the
+class also turns out to lack a knob lint didn't find, that knob is left out
+of the class's compiled plan rather than failing on every redraw. Classes
+whose nodes can have knobs a fresh one doesn't (Groups and gizmos with user
+knobs, Reads and Writes with per-file-type knobs) are only reported on.
+
+Run from Edit > Labelmaker Lint Configs, or headless:
+
+    nuke -t labelmaker_lint.py [config.json ...]
+
+which lints the given files (or the composed config if none are given),
+prints the issues and exits non-zero if any of them are errors.
+"""
+import collections
+import json
+import sys
+
+import nuke
+import labelmaker_plan
+import labelmaker_tcl
+
+ERROR = "error"
+WARNING = "warning"
+
+KNOWN_ENTRY_KEYS = ("name", "label", "default", "always_show", "colorize", "tcl_string")
+
+# entry_index is None for problems with the class as a whole
+LintIssue = collections.namedtuple("LintIssue", ["node_class", "entry_index", "severity", "message"])
+
+
+def knob_set(node_class):
+    """({knob_name: value}, knobs vary) of a freshly created node_class node, or (None, True) if it can't be created.
+
+    knobs vary is True if other nodes of the class can have knobs this one doesn't.
+    """
+    nuke.Undo.disable()
+    try:
+        try:
+            node = getattr(nuke.nodes, node_class)()
+        except (RuntimeError, AttributeError):
+            return None, True
+        try:
+            knobs = node.knobs()
+            knob_values = {name: _knob_value(knob) for name, knob in knobs.items()}
+            return knob_values, _knobs_vary(node, knobs)
+        finally:
+            nuke.delete(node)
+    finally:
+        nuke.Undo.enable()
+
+
+def _knobs_vary(node, knobs):
+    # Groups and gizmos carry user knobs, and Reads and Writes grow knobs for
+    # the file type they're set to
+    return isinstance(node, nuke.Group) or "file_type" in knobs
+
+
+def _knob_value(knob):
+    try:
+        return knob.value()
+    except (TypeError, ValueError, RuntimeError):
+        # some knob types (buttons, tabs...) have no meaningful value
+        return None
+
+
+def _is_list(value):
+    return isinstance(value, (list, tuple))
+
+
+def lint_entry(node_class, entry_index, item, knob_values, knobs_vary=False):
+    """Issues with one config entry. knob_values and knobs_vary are from knob_set(node_class)."""
+    issues = []
+
+    def issue(severity, message, *args):
+        issues.append(LintIssue(node_class, entry_index, severity, message.format(*args)))
+
+    if not isinstance(item, dict):
+        issue(ERROR, "entry is not an object: {!r}", item)
+        return issues
+    for key in item:
+        if key not in KNOWN_ENTRY_KEYS:
+            issue(WARNING, "unknown key {!r} is ignored", key)
+
+    if "tcl_string" in item:
+        if "name" in item:
+            issue(WARNING, "has both tcl_string and name; name is ignored")
+        tcl_string = str(item["tcl_string"])
+        if tcl_string.count("[") != tcl_string.count("]"):
+            issue(ERROR, "unbalanced brackets in tcl_string {!r}", tcl_string)
+        if knob_values is not None:
+            for knob_name in labelmaker_tcl.TclSnippet(tcl_string).knob_names:
+                if knob_name not in knob_values:
+                    issue(WARNING, "tcl_string reads knob {!r}, which {} does not have", knob_name, node_class)
+        return issues
+
+    if "name" not in item:
+        issue(ERROR, "entry has neither name nor tcl_string")
+        return issues
+    knob_name = item["name"]
+    if "label" in item and not isinstance(item["label"], str):
+        issue(WARNING, "label of {!r} is not a string", knob_name)
+    for key in ("always_show", "colorize"):
+        if key in item and not isinstance(item[key], bool):
+            issue(WARNING, "{} of {!r} is not true or false", key, knob_name)
+
+    if knob_values is None:
+        return issues
+    if knob_name not in knob_values:
+        if knobs_vary:
+            issue(WARNING, "knob {!r} does not exist on a new {}, but may on others", knob_name, node_class)
+        else:
+            issue(WARNING, "knob {!r} does not exist on {}; it is left out of the label", knob_name, node_class)
+        return issues
+    if "default" not in item:
+        return issues
+    default = item["default"]
+    value = knob_values[knob_name]
+    if _is_list(value) and not _is_list(default):
+        issue(ERROR, "knob {!r} is list-valued but default {!r} is not a list; the line always shows", knob_name, default)
+    elif _is_list(value) and len(value) != len(default):
+        issue(ERROR, "knob {!r} has {} values but default has {}; the line always shows", knob_name, len(value), len(default))
+    elif isinstance(value, str) != isinstance(default, str) and not _is_list(default):
+        issue(ERROR, "knob {!r} value {!r} and default {!r} are different types; the line always shows", knob_name, value, default)
+    elif isinstance(value, str) and _is_list(default):
+        issue(ERROR, "knob {!r} is not list-valued but default {!r} is a list; the line always shows", knob_name, default)
+    return issues
+
+
+def lint_config(config, node_classes=None):
+    """Lint a {node_class: [entry, ...]} mapping, or anything with its keys() and get().
+
+    Returns (issues, knob_sets), where knob_sets is {node_class: frozenset of
+    knob names} for every class that could be instantiated and whose nodes
+    all have the same knobs.
+    """
+    issues = []
+    knob_sets = {}
+    for node_class in sorted(node_classes if node_classes is not None else config.keys()):
+        items = config.get(node_class)
+        if not isinstance(items, list):
+            issues.append(LintIssue(node_class, None, ERROR, "value is not a list of entries"))
+            continue
+        knob_values, knobs_vary = knob_set(node_class)
+        if knob_values is None:
+            issues.append(LintIssue(
+                node_class, None, WARNING, "no node of this class can be created here, knobs not checked"
+            ))
+        elif not knobs_vary:
+            knob_sets[node_class] = frozenset(knob_values)
+        for entry_index, item in enumerate(items):
+            issues.extend(lint_entry(node_class, entry_index, item, knob_values, knobs_vary))
+    return issues, knob_sets
+
+
+def apply_knob_sets(knob_sets):
+    """Tell the plan compiler which knobs each class has."""
+    for node_class, knob_names in knob_sets.items():
+        labelmaker_plan.set_known_knobs(node_class, knob_names)
+
+
+def format_issues(issues):
+    if not issues:
+        return "Labelmaker lint: no issues found."
+    lines = []
+    for issue in issues:
+        location = issue.node_class if issue.entry_index is None else "{}[{}]".format(
+            issue.node_class, issue.entry_index
+        )
+        lines.append("{:<7} {:<32} {}".format(issue.severity, location, issue.message))
+    return "\n".join(lines)
+
+
+def show_lint_report(autolabeller):
+    """Edit menu command: lint the composed config, print the results and apply them to autolabeller."""
+    config = autolabeller.config
+    issues, knob_sets = lint_config(config)
+    apply_knob_sets(knob_sets)
+    autolabeller.invalidate_plans()
+    print(format_issues(issues))
+    error_count = sum(1 for issue in issues if issue.severity == ERROR)
+    nuke.message("Labelmaker lint: {} errors, {} warnings. Details are in the Script Editor.".format(
+        error_count, len(issues) - error_count
+    ))
+
+
+def main(argv):
+    if argv:
+        issues = []
+        for path in argv:
+            with open(path, "r") as f:
+                file_issues, _ = lint_config(json.load(f))
+            if file_issues:
+                print("{}:".format(path))
+                print(format_issues(file_issues))
+            issues.extend(file_issues)
+    else:
+        import labelmaker_config
+        issues, _ = lint_config(labelmaker_config.composed_config_singleton)
+        print(format_issues(issues))
+    return 1 if any(issue.severity == ERROR for issue in issues) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,109 @@
+"""Friendly names for OFX plugin node classes, discovered lazily.
+
+OFX node classes look like "OFXuk.co.thefoundry.furnace.f_denoise_v2"; the
+friendly name is only available from the Nodes toolbar entry that creates the
+node. Walking the whole toolbar is slow on facility setups with thousands of
+entries, so it only happens the first time an OFX class is missing from the
+mappings, and the result is cached on disk keyed by the Nuke version and
+plugin paths so later sessions can skip the walk entirely.
+"""
+import json
+import os
+import re
+
+import nuke
+import labelmaker_io
+
+CACHE_PATH = os.environ.get(
+    "LABELMAKER_OFX_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".nuke", "labelmaker_ofx_cache.json"),
+)
+OFX_CLASS_REGEX = re.compile(r"OFX.*(?=[\'\"])")
+
+
+def find_ofx_class(menu_script):
+    regex = OFX_CLASS_REGEX.search(menu_script)
+    if regex:
+        return regex.group(0)
+    else:
+        return None
+
+
+def walk_menu(menu):
+    """Return (name, script) for every command under menu, without recursion."""
+    menu_item_leaves = []
+    pending_menus = [menu]
+    while pending_menus:
+        for item in pending_menus.pop().items():
+            if isinstance(item, nuke.Menu):
+                pending_menus.append(item)
+            elif isinstance(item, nuke.MenuItem):
+                try:
+                    script = item.script()
+                    name = item.name()
+                    menu_item_leaves.append((name, script))
+                except Exception:
+                    # TODO: don't except everything?
+                    pass
+    return menu_item_leaves
+
+
+def discover_ofx_mappings():
+    """Walk the Nodes toolbar for {ofx_class: friendly_name}."""
+    mappings = {}
+    for name, script in walk_menu(nuke.toolbar("Nodes")):
+        if not isinstance(script, str) or "OFX" not in script:
+            continue
+        ofx_class = find_ofx_class(script)
+        if ofx_class:
+            mappings[ofx_class] = name
+    return mappings
+
+
+def cache_key():
+    """What the toolbar contents depend on; a cached walk is only valid for the same key."""
+    return {
+        "nuke_version": nuke.NUKE_VERSION_STRING,
+        "plugin_path": list(nuke.pluginPath()),
+        "ofx_plugin_path": os.environ.get("OFX_PLUGIN_PATH", ""),
+    }
+
+
+class OfxClassMappings(object):
+    def __init__(self, cache_path=CACHE_PATH):
+        super(OfxClassMappings, self).__init__()
+        self.cache_path = cache_path
+        self._mappings = None  # loaded from the disk cache on first lookup
+        self._walked = False   # the toolbar is walked at most once per session
+
+    def lookup(self, ofx_class):
+        """Return the friendly name for ofx_class, or None if the toolbar has none."""
+        if self._mappings is None:
+            self._mappings = self._load_cache()
+        if ofx_class not in self._mappings and not self._walked:
+            # a new plugin, or no usable cache: walk once and remember the result
+            self._walked = True
+            self._mappings = discover_ofx_mappings()
+            self._save_cache()
+        return self._mappings.get(ofx_class)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                cached = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(cached, dict) or cached.get("key") != cache_key():
+            return {}
+        return dict(cached.get("mappings", {}))
+
+    def _save_cache(self):
+        try:
+            # other Nuke sessions may be reading it; never leave it half-written
+            labelmaker_io.write_atomic(
+                self.cache_path,
+                json.dumps({"key": cache_key(), "mappings": self._mappings}, indent=2),
+            )
+        except (IOError, OSError):
+            # the cache is an optimisation only
+            pass
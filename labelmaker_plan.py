@@ -0,0 +1,137 @@
+"""Compiled per-class label plans.
+
+The composed config is a dict of raw JSON lists. Interpreting those lists on
+every autolabel call means repeated key lookups, default handling and prefs
+reads for every knob of every node on every redraw. Instead, each class's list
+is compiled once into an immutable LabelPlan, which the autolabeller simply
+executes. Plans must be recompiled whenever the config or prefs change.
+"""
+import collections
+
+import labelmaker_prefs
+import labelmaker_tcl
+
+COLOR_KNOB_CLASSES = ("Color_Knob", "AColor_Knob")
+
+# {node_class: frozenset of knob names} of a freshly created node, filled in by
+# labelmaker_lint for classes whose nodes all have the same knobs
+_known_knobs = {}
+# {node_class: set of knob names} that aren't in _known_knobs and that a real
+# node has then also turned out not to have. Knob entries for these are left
+# out of the class's plan.
+_missing_knobs = {}
+
+# A config line that is a raw TCL string, evaluated in the node's context
+# through its precompiled labelmaker_tcl.TclSnippet
+TclEntry = collections.namedtuple("TclEntry", ["tcl_string", "snippet"])
+
+# A config line that reads out a knob.
+# show_always: the line is shown regardless of the knob's value, either because
+#              there is no default or because always_show is in effect
+# colorize:    colorize the readout if the knob turns out to be a colour knob
+KnobEntry = collections.namedtuple(
+    "KnobEntry",
+    ["name", "label", "default", "formatted_default", "show_always", "colorize"],
+)
+
+# knob_names: every knob the entries read, for fingerprinting
+# cacheable:  False if any entry's output can depend on more than those knobs
+LabelPlan = collections.namedtuple(
+    "LabelPlan", ["node_class", "entries", "knob_names", "cacheable"]
+)
+
+
+def format_knob_value(value):
+    if isinstance(value, (float)):
+        knob_value_formatted = "{:.3f}".format(value)
+    else:
+        knob_value_formatted = "{}".format(value)
+    return knob_value_formatted
+
+
+def format_knob_values(values):
+    values_string_list = [format_knob_value(value) for value in values]
+    values_formatted = ", ".join(values_string_list)
+    return values_formatted
+
+
+def compile_entry(item, always_show_all, colorize_disable):
+    if "tcl_string" in item.keys():
+        tcl_string = str(item["tcl_string"])
+        return TclEntry(tcl_string=tcl_string, snippet=labelmaker_tcl.TclSnippet(tcl_string))
+
+    default = item.get("default", False)
+    try:
+        formatted_default = format_knob_values(default)
+    except TypeError:
+        # default isn't iterable
+        formatted_default = format_knob_value(default)
+    # always show if user has selected to always show, otherwise fall back
+    # to the node's setting from the config
+    always_show = always_show_all or item.get("always_show", False)
+    return KnobEntry(
+        name=item["name"],
+        label=item.get("label", item["name"]),
+        default=default,
+        formatted_default=formatted_default,
+        show_always=default is False or bool(always_show),
+        colorize=False if colorize_disable else item.get("colorize", True),
+    )
+
+
+def set_known_knobs(node_class, knob_names):
+    _known_knobs[node_class] = frozenset(knob_names)
+    _missing_knobs.pop(node_class, None)
+
+
+def knob_missing(node_class, knob_name):
+    """Note that a real node_class node lacks knob_name.
+
+    Returns True if that confirms what lint found, so node_class's plan
+    should be recompiled without it.
+    """
+    known_knobs = _known_knobs.get(node_class)
+    if known_knobs is None or knob_name in known_knobs:
+        return False
+    missing_knobs = _missing_knobs.setdefault(node_class, set())
+    if knob_name in missing_knobs:
+        return False
+    missing_knobs.add(knob_name)
+    return True
+
+
+def compile_plan(node_class, knob_dict_list):
+    """Compile the config list for node_class against the current prefs.
+
+    Returns None if there is no config for the class.
+    """
+    if knob_dict_list is None:
+        return None
+    prefs = labelmaker_prefs.prefs_singleton
+    always_show_all = prefs.get("always_show_all")
+    colorize_disable = prefs.get("colorize_disable")
+    entries = tuple(
+        compile_entry(item, always_show_all, colorize_disable)
+        for item in knob_dict_list
+    )
+    missing_knobs = _missing_knobs.get(node_class)
+    if missing_knobs:
+        entries = tuple(
+            entry for entry in entries
+            if not isinstance(entry, KnobEntry) or entry.name not in missing_knobs
+        )
+    knob_names = []
+    for entry in entries:
+        if isinstance(entry, KnobEntry):
+            knob_names.append(entry.name)
+        else:
+            knob_names.extend(entry.snippet.knob_names)
+    return LabelPlan(
+        node_class=node_class,
+        entries=entries,
+        knob_names=tuple(knob_names),
+        # TCL beyond [value knob] can reference anything, including other nodes
+        cacheable=all(
+            entry.snippet.is_local for entry in entries if isinstance(entry, TclEntry)
+        ),
+    )
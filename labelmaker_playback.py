@@ -0,0 +1,108 @@
+"""Throttle relabelling of animated nodes while the timeline is playing.
+
+Nuke redraws every visible node with animated knobs on every frame, and each
+redraw runs the autolabel. During playback that work competes with the viewer
+for no real benefit: nobody reads a label that changes 24 times a second.
+
+Nuke has no Python hook for "playback started", so PlaybackThrottle infers it
+from the autolabel calls themselves: several frame changes in quick
+succession mean the timeline is playing (or being scrubbed). While it is, an
+animated node keeps its previous label unless it has not been refreshed for
+1 / max_rate seconds. Once the frame has been still for a moment, every node
+that was held back is redrawn so its label is exact again.
+
+Labels for each (node, frame) are memoised by the label cache regardless of
+this setting, since the fingerprint of an animated node includes the frame.
+"""
+import time
+
+# consecutive frame changes, each within PLAYBACK_FRAME_GAP seconds of the last,
+# before we treat the timeline as playing
+PLAYBACK_FRAME_CHANGES = 3
+PLAYBACK_FRAME_GAP = 0.5
+# how long the frame must stay put before the final refresh
+PLAYBACK_STOP_DELAY_MS = 300
+
+
+class PlaybackThrottle(object):
+    def __init__(self, max_rate=4.0):
+        super(PlaybackThrottle, self).__init__()
+        self.max_rate = max_rate
+        self.frame = None
+        self.frame_changed_at = None
+        self.frame_changes = 0
+        self._refreshed_at = {}  # {node full name: perf_counter of last real relabel}
+        self._labels = {}  # {node full name: last label shown}
+        self._held_nodes = {}  # {node full name: node} given a stale label during playback
+        self._stop_timer = None  # created lazily on first use (PySide6 not imported at module level)
+
+    @property
+    def playing(self):
+        return self.frame_changes >= PLAYBACK_FRAME_CHANGES
+
+    def observe_frame(self, frame, now=None):
+        """Note the current frame; call once per autolabel of an animated node."""
+        if frame == self.frame:
+            return
+        now = time.perf_counter() if now is None else now
+        if self.frame_changed_at is not None and now - self.frame_changed_at < PLAYBACK_FRAME_GAP:
+            self.frame_changes += 1
+        else:
+            self.frame_changes = 1
+        self.frame = frame
+        self.frame_changed_at = now
+        if self.playing:
+            self._get_stop_timer().start()  # restarts timer if already running
+
+    def held_label(self, node, node_key, now=None):
+        """The label to keep showing for node_key, or None if it should be relabelled now."""
+        if not self.playing:
+            return None
+        label = self._labels.get(node_key)
+        if label is None:
+            return None
+        now = time.perf_counter() if now is None else now
+        if now - self._refreshed_at.get(node_key, 0.0) >= 1.0 / self.max_rate:
+            return None
+        self._held_nodes[node_key] = node
+        return label
+
+    def labelled(self, node_key, label, now=None):
+        """Record the label just computed for node_key."""
+        self._labels[node_key] = label
+        self._refreshed_at[node_key] = time.perf_counter() if now is None else now
+        self._held_nodes.pop(node_key, None)
+
+    def discard(self, node_key):
+        """Forget node_key, and everything inside it if it is a Group."""
+        prefix = node_key + "."
+        for records in (self._refreshed_at, self._labels, self._held_nodes):
+            records.pop(node_key, None)
+            for key in [key for key in records if key.startswith(prefix)]:
+                del records[key]
+
+    def clear(self):
+        self._refreshed_at.clear()
+        self._labels.clear()
+        self._held_nodes.clear()
+
+    def _get_stop_timer(self):
+        if self._stop_timer is None:
+            from PySide6 import QtCore
+            self._stop_timer = QtCore.QTimer()
+            self._stop_timer.setSingleShot(True)
+            self._stop_timer.setInterval(PLAYBACK_STOP_DELAY_MS)
+            self._stop_timer.timeout.connect(self.playback_stopped)
+        return self._stop_timer
+
+    def playback_stopped(self):
+        """Redraw every node that was given a stale label, now that playback is over."""
+        self.frame_changes = 0
+        held_nodes = list(self._held_nodes.values())
+        self._held_nodes.clear()
+        for node in held_nodes:
+            try:
+                node.redraw()
+            except ValueError:
+                # the node was deleted during playback
+                pass
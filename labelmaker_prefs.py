@@ -1,6 +1,8 @@
 import json
 import os
 
+import labelmaker_io
+
 PREFS_FILE = os.path.join(os.path.expanduser("~"), ".nuke", "labelmaker_prefs.json")
 
 DEFAULTS = {
@@ -10,6 +12,10 @@ DEFAULTS = {
     "colorize_disable": False,
     "use_base_config": True,
     "deoverlap_enabled": True,
+    "retract_enabled": False,
+    "profiling_enabled": False,
+    "playback_throttle_enabled": False,
+    "playback_max_label_rate": 4.0,
 }
 
 
@@ -33,9 +39,9 @@ class LabelmakerPrefs:
     def set(self, key, value):
         self._prefs[key] = value
 
-    def save(self):
-        with open(self._prefs_file, "w") as f:
-            json.dump(self._prefs, f, indent=2)
+    def save(self, callback=None):
+        """Save in the background; callback(path, error) is called on the main thread when done."""
+        labelmaker_io.writer_singleton.write_json(self._prefs_file, self._prefs, callback, indent=2)
 
     def reload(self):
         self._prefs = self._load()
@@ -8,6 +8,7 @@ from PySide6.QtWidgets import (
     QHBoxLayout,
     QCheckBox,
     QLineEdit,
+    QMessageBox,
     QPushButton,
     QVBoxLayout,
     QWidget,
@@ -16,6 +17,8 @@ from PySide6.QtWidgets import (
 import labelmaker
 import labelmaker_config
 import labelmaker_prefs
+import labelmaker_profiling
+import labelmaker_relabel
 
 
 class LabelmakerPrefsDialog(QDialog):
@@ -96,6 +99,32 @@ class LabelmakerPrefsDialog(QDialog):
         )
         form_layout.addRow("Enable Auto De-overlap:", self.deoverlap_enabled_checkbox)
 
+        # retract_enabled checkbox
+        self.retract_enabled_checkbox = QCheckBox()
+        self.retract_enabled_checkbox.setToolTip(
+            "When enabled, Labelmaker pulls the nodes resting below a node back up "
+            "whenever its label gets shorter, closing the gap it leaves."
+        )
+        form_layout.addRow("Retract When Labels Shrink:", self.retract_enabled_checkbox)
+
+        # profiling_enabled checkbox
+        self.profiling_enabled_checkbox = QCheckBox()
+        self.profiling_enabled_checkbox.setToolTip(
+            "Time each stage of the autolabel per node class. Dump the results with "
+            "Edit > Labelmaker Profiling Report... to attach real numbers to bug reports. "
+            "Adds a small overhead while enabled."
+        )
+        form_layout.addRow("Enable Profiling:", self.profiling_enabled_checkbox)
+
+        # playback_throttle_enabled checkbox
+        self.playback_throttle_enabled_checkbox = QCheckBox()
+        self.playback_throttle_enabled_checkbox.setToolTip(
+            "While the timeline is playing, refresh the labels of animated nodes at most a "
+            "few times a second instead of on every frame, then refresh them exactly once "
+            "playback stops. Frees up time for the viewer in scripts with many animated nodes."
+        )
+        form_layout.addRow("Throttle Labels During Playback:", self.playback_throttle_enabled_checkbox)
+
         # OK / Cancel buttons
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         button_box.accepted.connect(self._on_accept)
@@ -112,6 +141,9 @@ class LabelmakerPrefsDialog(QDialog):
         raw_use_base_config = prefs._prefs.get("use_base_config", True)
         self.use_base_config_checkbox.setChecked(bool(raw_use_base_config))
         self.deoverlap_enabled_checkbox.setChecked(bool(prefs.get("deoverlap_enabled")))
+        self.retract_enabled_checkbox.setChecked(bool(prefs.get("retract_enabled")))
+        self.profiling_enabled_checkbox.setChecked(bool(prefs.get("profiling_enabled")))
+        self.playback_throttle_enabled_checkbox.setChecked(bool(prefs.get("playback_throttle_enabled")))
 
     def _browse_personal_config_path(self):
         current_path = self.personal_config_path_edit.text()
@@ -127,21 +159,46 @@ class LabelmakerPrefsDialog(QDialog):
 
     def _on_accept(self):
         prefs = labelmaker_prefs.prefs_singleton
+        was_enabled = bool(prefs.get("labelmaker_enabled"))
         prefs.set("labelmaker_enabled", self.labelmaker_enabled_checkbox.isChecked())
         prefs.set("personal_config_path", self.personal_config_path_edit.text())
         prefs.set("always_show_all", self.always_show_all_checkbox.isChecked())
         prefs.set("colorize_disable", self.colorize_disable_checkbox.isChecked())
         prefs.set("use_base_config", self.use_base_config_checkbox.isChecked())
         prefs.set("deoverlap_enabled", self.deoverlap_enabled_checkbox.isChecked())
-        prefs.save()
+        prefs.set("retract_enabled", self.retract_enabled_checkbox.isChecked())
+        prefs.set("profiling_enabled", self.profiling_enabled_checkbox.isChecked())
+        prefs.set("playback_throttle_enabled", self.playback_throttle_enabled_checkbox.isChecked())
+        prefs.save(callback=_report_prefs_saved)
+        labelmaker_profiling.profiler_singleton.refresh_enabled()
 
         labelmaker_config.reload_composed_config()
-        labelmaker.autolabeller_singleton.config = labelmaker_config.composed_config_singleton
-        labelmaker.autolabeller_singleton.set_enabled(self.labelmaker_enabled_checkbox.isChecked())
+        autolabeller = labelmaker.autolabeller_singleton
+        changed_classes = autolabeller.changed_classes(labelmaker_config.composed_config_singleton)
+        autolabeller.config = labelmaker_config.composed_config_singleton
+        enabled = self.labelmaker_enabled_checkbox.isChecked()
+        autolabeller.set_enabled(enabled)
+
+        # refresh labels now rather than whenever Nuke happens to repaint them
+        if enabled != was_enabled:
+            labelmaker_relabel.relabel_script()
+        else:
+            autolabeller.relabel_classes(changed_classes)
 
         self.accept()
 
 
+def _report_prefs_saved(path, error):
+    # the dialog closes without waiting for the save, so failures are reported here
+    if error is not None:
+        QMessageBox.warning(
+            None,
+            "Labelmaker Preferences",
+            "Your preferences are in effect for this session, but couldn't be saved to "
+            "{}:\n\n{}".format(path, error),
+        )
+
+
 def show_prefs_dialog():
     dialog = LabelmakerPrefsDialog()
     dialog.exec()
@@ -0,0 +1,248 @@
+"""Opt-in timing of the autolabel hot path, per node class and stage.
+
+Enable with the "Enable Profiling" preference or by setting the
+LABELMAKER_PROFILE environment variable to 1. While disabled, instrumented
+code pays for one attribute check per stage.
+
+Each (node class, stage) pair keeps a rolling window of its most recent
+durations for percentiles, plus running call counts and totals. Note that
+stages nest: "tcl_subst" time is also counted in the stage that called it.
+
+AutolabelStats, enabled by the same switch, breaks the cost down further, per
+node class and per config entry, for tuning configs rather than code.
+"""
+import collections
+import csv
+import json
+import os
+import time
+
+import nuke
+import labelmaker_prefs
+
+PROFILE_ENV_VAR = "LABELMAKER_PROFILE"
+HISTORY_SIZE = 1024  # samples kept per (node class, stage)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class StageProfiler(object):
+    def __init__(self, history_size=HISTORY_SIZE):
+        super(StageProfiler, self).__init__()
+        self.history_size = history_size
+        self.enabled = False
+        self.reset()
+
+    def refresh_enabled(self):
+        """Re-read the env var and prefs toggle."""
+        self.enabled = bool(
+            os.environ.get(PROFILE_ENV_VAR) == "1"
+            or labelmaker_prefs.prefs_singleton.get("profiling_enabled")
+        )
+
+    def reset(self):
+        self._samples = {}  # {(node_class, stage): deque of seconds}
+        self._calls = collections.Counter()
+        self._totals = collections.Counter()
+
+    def record(self, node_class, stage, seconds):
+        key = (node_class, stage)
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = collections.deque(maxlen=self.history_size)
+        samples.append(seconds)
+        self._calls[key] += 1
+        self._totals[key] += seconds
+
+    def time_call(self, node_class, stage, function, *args):
+        """Call function(*args), recording its duration if profiling is enabled."""
+        if not self.enabled:
+            return function(*args)
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.record(node_class, stage, time.perf_counter() - start)
+
+    def report(self):
+        """One row per (node class, stage), slowest p95 first. Times in milliseconds."""
+        rows = []
+        for key, samples in self._samples.items():
+            sorted_samples = sorted(samples)
+            rows.append({
+                "node_class": key[0],
+                "stage": key[1],
+                "calls": self._calls[key],
+                "total_ms": self._totals[key] * 1000.0,
+                "p50_ms": _percentile(sorted_samples, 0.50) * 1000.0,
+                "p95_ms": _percentile(sorted_samples, 0.95) * 1000.0,
+                "p99_ms": _percentile(sorted_samples, 0.99) * 1000.0,
+            })
+        rows.sort(key=lambda row: (row["p95_ms"], row["total_ms"]), reverse=True)
+        return rows
+
+    def format_report(self):
+        lines = ["{:<28} {:<24} {:>9} {:>11} {:>9} {:>9} {:>9}".format(
+            "node class", "stage", "calls", "total ms", "p50 ms", "p95 ms", "p99 ms"
+        )]
+        for row in self.report():
+            lines.append("{:<28} {:<24} {:>9} {:>11.2f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                row["node_class"],
+                row["stage"],
+                row["calls"],
+                row["total_ms"],
+                row["p50_ms"],
+                row["p95_ms"],
+                row["p99_ms"],
+            ))
+        return "\n".join(lines)
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"nuke_version": nuke.NUKE_VERSION_STRING, "stages": self.report()}, f, indent=2)
+
+
+# the whole autolabel of a class is reported as this entry
+CLASS_TOTAL_ENTRY = "*"
+STATS_FIELDS = (
+    "node_class",
+    "entry",
+    "calls",
+    "total_ms",
+    "mean_us",
+    "tcl_evaluations",
+    "missing_knobs",
+    "lines",
+    "lines_per_call",
+)
+
+
+class AutolabelStats(object):
+    """Running counters per node class and per config entry.
+
+    For each class (entry CLASS_TOTAL_ENTRY) and each of its config entries,
+    keeps calls, total time, TCL interpreter evaluations, knobs missing from
+    the node (swallowed NameErrors), and lines produced. Entries are only
+    executed when a label is not served from the label cache, so their calls
+    count cache misses, while class rows count every autolabel.
+    """
+
+    def __init__(self):
+        super(AutolabelStats, self).__init__()
+        self.reset()
+
+    def reset(self):
+        self._counters = {}  # {(node_class, entry): [calls, seconds, tcl_evaluations, missing_knobs, lines]}
+
+    def _get(self, node_class, entry):
+        key = (node_class, entry)
+        counters = self._counters.get(key)
+        if counters is None:
+            counters = self._counters[key] = [0, 0.0, 0, 0, 0]
+        return counters
+
+    def record_class(self, node_class, seconds, lines):
+        counters = self._get(node_class, CLASS_TOTAL_ENTRY)
+        counters[0] += 1
+        counters[1] += seconds
+        counters[4] += lines
+
+    def record_entry(self, node_class, entry, seconds, tcl_evaluations=0, missing_knob=False, lines=0):
+        counters = self._get(node_class, entry)
+        counters[0] += 1
+        counters[1] += seconds
+        counters[2] += tcl_evaluations
+        counters[3] += int(missing_knob)
+        counters[4] += lines
+
+    def rows(self):
+        """One dict per (node class, entry), most total time first."""
+        rows = []
+        for (node_class, entry), counters in self._counters.items():
+            calls, seconds, tcl_evaluations, missing_knobs, lines = counters
+            rows.append({
+                "node_class": node_class,
+                "entry": entry,
+                "calls": calls,
+                "total_ms": seconds * 1000.0,
+                "mean_us": seconds * 1e6 / calls if calls else 0.0,
+                "tcl_evaluations": tcl_evaluations,
+                "missing_knobs": missing_knobs,
+                "lines": lines,
+                "lines_per_call": float(lines) / calls if calls else 0.0,
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def format_report(self):
+        lines = ["{:<28} {:<32} {:>9} {:>11} {:>9} {:>7} {:>9} {:>7}".format(
+            "node class", "entry", "calls", "total ms", "mean us", "tcl", "missing", "lines"
+        )]
+        for row in self.rows():
+            lines.append("{:<28} {:<32} {:>9} {:>11.2f} {:>9.1f} {:>7} {:>9} {:>7.2f}".format(
+                row["node_class"],
+                row["entry"][:32],
+                row["calls"],
+                row["total_ms"],
+                row["mean_us"],
+                row["tcl_evaluations"],
+                row["missing_knobs"],
+                row["lines_per_call"],
+            ))
+        return "\n".join(lines)
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"nuke_version": nuke.NUKE_VERSION_STRING, "entries": self.rows()}, f, indent=2)
+
+    def dump_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=STATS_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+
+profiler_singleton = StageProfiler()
+profiler_singleton.refresh_enabled()
+stats_singleton = AutolabelStats()
+
+
+def _warn_if_disabled():
+    if profiler_singleton.enabled:
+        return False
+    nuke.message(
+        "Labelmaker profiling is disabled. Enable it in Labelmaker Preferences "
+        "or set {}=1, then use the script for a while before dumping a report.".format(
+            PROFILE_ENV_VAR
+        )
+    )
+    return True
+
+
+def show_report():
+    """Edit menu command: print the report to the Script Editor and optionally save it as JSON."""
+    if _warn_if_disabled():
+        return
+    print(profiler_singleton.format_report())
+    path = nuke.getFilename("Save Labelmaker Profiling Report", "*.json")
+    if path:
+        profiler_singleton.dump_json(path)
+
+
+def show_stats():
+    """Edit menu command: print per-entry stats to the Script Editor and optionally save them."""
+    if _warn_if_disabled():
+        return
+    print(stats_singleton.format_report())
+    path = nuke.getFilename("Save Labelmaker Autolabel Stats (.csv or .json)", "*.csv *.json")
+    if not path:
+        return
+    if path.lower().endswith(".json"):
+        stats_singleton.dump_json(path)
+    else:
+        stats_singleton.dump_csv(path)
@@ -0,0 +1,130 @@
+"""Relabel the whole script without freezing the UI.
+
+Nuke only re-runs an autolabel when it repaints a node, so after a config or
+prefs change a big script shows a stale mix of old and new labels for a long
+time. relabel_script() walks every node (including inside Groups) on the Qt
+event loop, redrawing as many as fit in a small time budget per tick, with a
+cancellable progress dialog that only appears if the job is slow.
+
+Nodes are redrawn nearest the DAG viewport first (see labelmaker_viewport).
+Once everything on screen is done, the rest is drained on slower idle ticks.
+"""
+import time
+
+import nuke
+import labelmaker_viewport
+
+TICK_BUDGET_SECONDS = 0.02  # time spent redrawing per event-loop tick
+IDLE_TICK_INTERVAL_MS = 50  # between ticks once no pending node is on screen
+PROGRESS_DIALOG_DELAY_MS = 500  # don't flash a dialog for quick jobs
+
+_active_job = None
+
+
+class BulkRelabeller(object):
+    """Redraw every node whose class is in node_classes (None for all nodes)."""
+
+    def __init__(self, node_classes=None, tick_budget=TICK_BUDGET_SECONDS):
+        super(BulkRelabeller, self).__init__()
+        self.node_classes = None if node_classes is None else set(node_classes)
+        self.tick_budget = tick_budget
+        nodes = nuke.allNodes(recurseGroups=True)
+        if self.node_classes is not None:
+            # only queue, and read the positions of, the nodes to be redrawn
+            nodes = [node for node in nodes if node.Class() in self.node_classes]
+        self._pending = labelmaker_viewport.NodeQueue(nodes)
+        self.total = len(self._pending)
+        self.relabelled = 0
+        self.finished = False
+        self.cancelled = False
+        self._timer = None
+        self._progress_dialog = None
+
+    @property
+    def done(self):
+        return self.total - len(self._pending)
+
+    def start(self):
+        try:
+            from PySide6 import QtCore, QtWidgets
+        except ImportError:
+            # no Qt (e.g. headless); just do it all now
+            while not self.finished:
+                self.run_slice(budget=None)
+            return
+        self._progress_dialog = QtWidgets.QProgressDialog(
+            "Relabelling nodes...", "Cancel", 0, self.total
+        )
+        self._progress_dialog.setWindowTitle("Labelmaker")
+        self._progress_dialog.setWindowModality(QtCore.Qt.NonModal)
+        self._progress_dialog.setMinimumDuration(PROGRESS_DIALOG_DELAY_MS)
+        self._progress_dialog.canceled.connect(self.cancel)
+        self._timer = QtCore.QTimer()
+        self._timer.setInterval(self._tick_interval())
+        self._timer.timeout.connect(self._tick)
+        self._timer.start()
+
+    def run_slice(self, budget=TICK_BUDGET_SECONDS):
+        """Relabel nodes until budget seconds have passed. Returns True when finished."""
+        deadline = None if budget is None else time.perf_counter() + budget
+        while self._pending:
+            node = self._pending.pop()
+            try:
+                node.redraw()
+                self.relabelled += 1
+            except ValueError:
+                # the node was deleted since the job started
+                pass
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        if not self._pending:
+            self.finished = True
+        return self.finished
+
+    def _tick_interval(self):
+        return 0 if self._pending.has_visible() else IDLE_TICK_INTERVAL_MS
+
+    def _tick(self):
+        # the artist may have panned or zoomed since the last tick
+        self._pending.reprioritise()
+        self.run_slice(self.tick_budget)
+        if self._progress_dialog is not None:
+            self._progress_dialog.setValue(self.done)
+        if self.finished:
+            self._stop()
+        else:
+            self._timer.setInterval(self._tick_interval())
+
+    def cancel(self):
+        self.cancelled = True
+        self._stop()
+
+    def _stop(self):
+        global _active_job
+        if self._timer is not None:
+            self._timer.stop()
+        if self._progress_dialog is not None:
+            self._progress_dialog.reset()
+            self._progress_dialog.close()
+        if _active_job is self:
+            _active_job = None
+
+
+def relabel_script(node_classes=None):
+    """Start relabelling nodes of node_classes (None for every node) in the background.
+
+    A job that is still running is replaced by one covering both its classes
+    and the new ones, starting over from the first node.
+    """
+    global _active_job
+    if node_classes is not None and not node_classes:
+        return None
+    if _active_job is not None and not _active_job.finished:
+        if node_classes is not None and _active_job.node_classes is not None:
+            node_classes = set(node_classes) | _active_job.node_classes
+        else:
+            node_classes = None
+        _active_job.cancel()
+    _active_job = BulkRelabeller(node_classes)
+    _active_job.start()
+    return _active_job
@@ -0,0 +1,178 @@
+"""Per-node autolabel state, scoped to the open script.
+
+The autolabeller remembers a little about each node between redraws (how
+many lines its label had, to spot growth). Keyed by plain node name in a dict
+that was never pruned, that state leaked across a long session, confused
+same-named nodes in different Groups, and treated a renamed node as new.
+
+NodeStateStore keys records by fullName, drops them when nodes are deleted,
+follows renames, is emptied whenever a script is closed or loaded, and is
+pruned of any nodes it missed the deletion of when the script is saved.
+Other per-node records keyed by fullName (e.g. the playback throttle's) can
+be registered as dependents to be dropped along with it. The
+records use __slots__ and hold only ints: hashes stand in for the fingerprint
+and label themselves.
+"""
+import nuke
+
+
+class NodeState(object):
+    __slots__ = ("line_count", "fingerprint_hash", "label_hash")
+
+    def __init__(self):
+        self.line_count = None
+        self.fingerprint_hash = None
+        self.label_hash = None
+
+
+class NodeStateStore(object):
+    def __init__(self, dependents=()):
+        super(NodeStateStore, self).__init__()
+        self._states = {}  # {node full name: NodeState}
+        # {Group full name ("" for the root): set of full names of the nodes in
+        # it that have state, themselves or through nodes inside them}. May
+        # also hold names whose state has since been dropped.
+        self._names = {}
+        # {Group full name: [new full name, ...]} of renames not yet matched
+        # to the names they replaced
+        self._renamed = {}
+        # other stores keyed by node full name, with discard(node_key) and clear()
+        self.dependents = list(dependents)
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, node_key):
+        if self._renamed:
+            self._match_renames()
+        return node_key in self._states
+
+    def get(self, node_key):
+        """The NodeState for node_key, created empty if there is none yet."""
+        if self._renamed:
+            self._match_renames()
+        state = self._states.get(node_key)
+        if state is None:
+            state = self._states[node_key] = NodeState()
+            self._index(node_key)
+        return state
+
+    def _index(self, node_key):
+        # add node_key, and the Groups it is inside, to their Groups' names
+        while True:
+            context = node_key.rpartition(".")[0]
+            names = self._names.setdefault(context, set())
+            if node_key in names:
+                return
+            names.add(node_key)
+            if not context:
+                return
+            node_key = context
+
+    def _keys_inside(self, node_key):
+        """Full names with state or index entries inside node_key, if it is a Group."""
+        keys = []
+        pending = [node_key]
+        while pending:
+            inner_keys = self._names.get(pending.pop(), ())
+            keys.extend(inner_keys)
+            pending.extend(inner_keys)
+        return keys
+
+    def discard(self, node_key):
+        """Forget node_key, and everything inside it if it is a Group."""
+        if self._renamed:
+            self._match_renames()
+        self._discard(node_key)
+
+    def _discard(self, node_key):
+        for key in self._keys_inside(node_key) + [node_key]:
+            self._states.pop(key, None)
+            self._names.pop(key, None)
+        self._names.get(node_key.rpartition(".")[0], set()).discard(node_key)
+        for dependent in self.dependents:
+            dependent.discard(node_key)
+
+    def clear(self):
+        self._states.clear()
+        self._names.clear()
+        self._renamed.clear()
+        for dependent in self.dependents:
+            dependent.clear()
+
+    def renamed(self, node):
+        """Note that node was renamed; its state follows it the next time any is needed.
+
+        Nuke doesn't report the old name, so that is when the names recorded
+        in the node's Group that no longer exist are looked for. Deferring it
+        keeps a batch of renames from looking once per rename.
+        """
+        new_key = node.fullName()
+        self._renamed.setdefault(new_key.rpartition(".")[0], []).append(new_key)
+
+    def _match_renames(self):
+        renamed = self._renamed
+        self._renamed = {}
+        for context, new_keys in renamed.items():
+            names = self._names.get(context, set())
+            # renamed again since, or already had state of its own
+            new_keys = set(
+                key for key in new_keys if key not in names and nuke.toNode(key) is not None
+            )
+            orphans = [key for key in names if nuke.toNode(key) is None]
+            if len(orphans) == 1 and len(new_keys) == 1:
+                # it was this node
+                self._move(orphans.pop(), new_keys.pop())
+            # otherwise which went where is unknown; anything left is stale
+            for key in orphans:
+                self._discard(key)
+
+    def _move(self, old_key, new_key):
+        # a renamed Group renames everything inside it too
+        for key in self._keys_inside(old_key) + [old_key]:
+            state = self._states.pop(key, None)
+            if state is not None:
+                self._states[new_key + key[len(old_key):]] = state
+            inner_names = self._names.pop(key, None)
+            if inner_names is not None:
+                self._names[new_key + key[len(old_key):]] = set(
+                    new_key + inner_key[len(old_key):] for inner_key in inner_names
+                )
+        names = self._names[old_key.rpartition(".")[0]]
+        names.discard(old_key)
+        names.add(new_key)
+        for dependent in self.dependents:
+            # they only hold what's cheap to rebuild under the new name
+            dependent.discard(old_key)
+
+    def prune(self):
+        """Drop entries for nodes that no longer exist. Returns how many were dropped."""
+        if self._renamed:
+            self._match_renames()
+        stale = [key for key in self._states if nuke.toNode(key) is None]
+        for key in stale:
+            self._states.pop(key, None)
+            for dependent in self.dependents:
+                dependent.discard(key)
+        self._names = {}
+        for key in self._states:
+            self._index(key)
+        return len(stale)
+
+    def _on_destroy(self):
+        self.discard(nuke.thisNode().fullName())
+
+    def _on_script_save(self):
+        # catches nodes whose deletion no onDestroy reported
+        self.prune()
+
+    def _on_knob_changed(self):
+        if nuke.thisKnob().name() == "name":
+            self.renamed(nuke.thisNode())
+
+    def register_callbacks(self):
+        nuke.addOnDestroy(self._on_destroy)
+        nuke.addKnobChanged(self._on_knob_changed)
+        nuke.addOnScriptClose(self.clear)
+        nuke.addOnScriptLoad(self.clear)
+        nuke.addOnScriptSave(self._on_script_save)
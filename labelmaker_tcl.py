@@ -0,0 +1,246 @@
+"""Precompiled TCL snippets for config tcl_strings and node labels.
+
+Most TCL in labels is plain text with [value knob] substitutions. Running it
+through nuke.tcl("subst", ...) re-parses the string on every redraw, and a
+failing substitution costs a RuntimeError every time. A TclSnippet parses the
+string once into literal and knob-lookup tokens and evaluates those with
+direct knob reads; only strings using anything beyond [value ...] (other
+commands, $variables, backslash escapes) still go through the interpreter.
+
+Evaluation keeps the interpreter's semantics: if any lookup fails, the
+snippet evaluates to its raw text, just like a failed subst did.
+"""
+import re
+
+import nuke
+
+VALUE_COMMAND_REGEX = re.compile(r"\[value\s+([A-Za-z_][\w.]*)\s*\]")
+# Characters subst would act on, outside of [value ...]
+TCL_SPECIAL_CHARACTERS = ("[", "$", "\\")
+
+# Knob classes whose Python value() prints exactly like [value knob] does.
+# Anything else (floats, bools, arrays) is read through nuke.value instead.
+DIRECT_READ_KNOB_CLASSES = (
+    "Enumeration_Knob",
+    "Channel_Knob",
+    "ChannelMask_Knob",
+    "Input_ChannelSet_Knob",
+    "Int_Knob",
+    "String_Knob",
+)
+
+# A fallback snippet that fails this many times in a row for a node stops
+# calling TCL for that node...
+FAILURE_LIMIT = 3
+# ...except for one retry every this many evaluations, in case it was transient
+# (e.g. [value input.first] on a node that gets connected later).
+FAILURE_RETRY_INTERVAL = 100
+
+# nuke.value returns this instead of raising when a lookup fails
+_MISSING = "\x00labelmaker-missing\x00"
+
+_LITERAL = 0
+_KNOB = 1  # a knob on the node itself
+_PATH = 2  # anything dotted, e.g. input.first; may reach other nodes
+
+
+def _needs_interpreter(text):
+    return any(character in text for character in TCL_SPECIAL_CHARACTERS)
+
+
+class TclSnippet(object):
+    def __init__(self, text):
+        super(TclSnippet, self).__init__()
+        self.text = text
+        self.tokens = self._compile(text)
+
+    def __eq__(self, other):
+        return isinstance(other, TclSnippet) and other.text == self.text
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        return "TclSnippet({!r})".format(self.text)
+
+    @staticmethod
+    def _compile(text):
+        """Return a tuple of (kind, text) tokens, or None if TCL is needed."""
+        tokens = []
+        position = 0
+        for match in VALUE_COMMAND_REGEX.finditer(text):
+            literal = text[position:match.start()]
+            if _needs_interpreter(literal):
+                return None
+            if literal:
+                tokens.append((_LITERAL, literal))
+            path = match.group(1)
+            knob_name = path[5:] if path.startswith("this.") else path
+            if "." in knob_name:
+                tokens.append((_PATH, path))
+            else:
+                tokens.append((_KNOB, knob_name))
+            position = match.end()
+        literal = text[position:]
+        if _needs_interpreter(literal):
+            return None
+        if literal:
+            tokens.append((_LITERAL, literal))
+        return tuple(tokens)
+
+    @property
+    def compiled(self):
+        return self.tokens is not None
+
+    @property
+    def is_local(self):
+        """True if the result depends only on knobs of the node itself."""
+        return self.compiled and all(kind != _PATH for kind, _ in self.tokens)
+
+    @property
+    def knob_names(self):
+        if not self.compiled:
+            return ()
+        return tuple(text for kind, text in self.tokens if kind == _KNOB)
+
+    def evaluate(self, node, tcl_subst, context="this"):
+        """Evaluate in node's context. tcl_subst(text) runs the interpreter for fallbacks.
+
+        context is the path knob paths are relative to: "this" inside a
+        callback, or node's full name when there is no thisNode().
+        """
+        if self.tokens is None:
+            return self._evaluate_with_interpreter(node, tcl_subst)
+        parts = []
+        for kind, text in self.tokens:
+            if kind == _LITERAL:
+                parts.append(text)
+                continue
+            if kind == _KNOB:
+                knob = node.knob(text)
+                if knob is None:
+                    return self.text
+                if knob.Class() in DIRECT_READ_KNOB_CLASSES:
+                    parts.append(str(knob.value()))
+                    continue
+            if context != "this":
+                text = "{}.{}".format(context, text[5:] if text.startswith("this.") else text)
+            value = nuke.value(text, _MISSING)
+            if value == _MISSING:
+                return self.text
+            parts.append(value)
+        return "".join(parts)
+
+    def failures(self, node_key):
+        """How many times in a row evaluation has failed for node_key."""
+        return failure_counts_singleton.failures(node_key, self.text)
+
+    def _evaluate_with_interpreter(self, node, tcl_subst):
+        node_key = node.fullName()
+        record = failure_counts_singleton.get(node_key, self.text)
+        if record is not None and record[0] >= FAILURE_LIMIT:
+            record[1] += 1
+            if record[1] % FAILURE_RETRY_INTERVAL:
+                return self.text
+        try:
+            result = tcl_subst(self.text)
+        except RuntimeError:
+            if record is None:
+                record = failure_counts_singleton.add(node_key, self.text)
+            record[0] += 1
+            return self.text
+        if record is not None:
+            failure_counts_singleton.remove(node_key, self.text)
+        return result
+
+
+class FailureCounts(object):
+    """Failing fallback snippets, per node.
+
+    Snippets are shared by every node of a class (and every node with the
+    same label text), so failures are counted per node: one that can't
+    evaluate a snippet mustn't stop the others from evaluating it. Records
+    are keyed by node full name, so they must be discarded when their node is
+    deleted or renamed, or a new node reusing the name would inherit them;
+    register this as a labelmaker_state.NodeStateStore dependent.
+    """
+
+    def __init__(self):
+        super(FailureCounts, self).__init__()
+        self._records = {}  # {node full name: {snippet text: [failures, skipped]}}, only while failing
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, node_key, text):
+        """The [failures, skipped] record of text for node_key, or None."""
+        records = self._records.get(node_key)
+        return None if records is None else records.get(text)
+
+    def add(self, node_key, text):
+        record = self._records.setdefault(node_key, {})[text] = [0, 0]
+        return record
+
+    def remove(self, node_key, text):
+        records = self._records.get(node_key)
+        if records is not None:
+            records.pop(text, None)
+            if not records:
+                del self._records[node_key]
+
+    def failures(self, node_key, text):
+        record = self.get(node_key, text)
+        return 0 if record is None else record[0]
+
+    def discard(self, node_key):
+        """Forget node_key, and everything inside it if it is a Group."""
+        self._records.pop(node_key, None)
+        prefix = node_key + "."
+        for key in [key for key in self._records if key.startswith(prefix)]:
+            del self._records[key]
+
+    def clear(self):
+        self._records.clear()
+
+
+class SnippetCache(object):
+    """Compiled snippets for free-form text such as label knobs, by text."""
+
+    def __init__(self, max_size=4096):
+        super(SnippetCache, self).__init__()
+        self.max_size = max_size
+        self._snippets = {}
+
+    def get(self, text):
+        snippet = self._snippets.get(text)
+        if snippet is None:
+            if len(self._snippets) >= self.max_size:
+                self._snippets.clear()
+            snippet = self._snippets[text] = TclSnippet(text)
+        return snippet
+
+    def clear(self):
+        self._snippets.clear()
+
+
+# Characters that would end or change a bare TCL word, with how to escape them
+_QUOTE_ESCAPES = {character: "\\" + character for character in '\\[]${}";# '}
+_QUOTE_ESCAPES.update({"\n": "\\n", "\t": "\\t", "\r": "\\r"})
+
+
+def quote(text):
+    """text as a single TCL word that the parser turns back into text, verbatim."""
+    if not text:
+        return "{}"
+    return "".join(_QUOTE_ESCAPES.get(character, character) for character in text)
+
+
+def needs_subst(text):
+    """False if subst would return text unchanged."""
+    return _needs_interpreter(text)
+
+
+failure_counts_singleton = FailureCounts()
@@ -0,0 +1,117 @@
+"""Order background work by distance from what the artist is looking at.
+
+After a config reload or script open every node needs relabelling, and a
+burst of label growth can push thousands of nodes. Doing that work nearest
+the DAG viewport first means what's on screen is right almost immediately,
+while the rest is drained lazily.
+
+Nuke exposes the DAG centre and zoom (nuke.center(), nuke.zoom()) but not
+the size of the DAG panel, so a node counts as visible if it falls within a
+typical panel size, VIEW_WIDTH x VIEW_HEIGHT screen pixels, of the centre.
+Nodes inside Groups are placed at their top-level Group, and are never
+visible from the top level.
+"""
+import heapq
+import itertools
+import math
+
+import nuke
+
+VIEW_WIDTH = 1600  # screen pixels
+VIEW_HEIGHT = 900
+
+
+class Viewport(object):
+    def __init__(self, center_x=0.0, center_y=0.0, zoom=1.0):
+        super(Viewport, self).__init__()
+        self.center_x = center_x
+        self.center_y = center_y
+        self.zoom = zoom or 1.0
+
+    @classmethod
+    def current(cls):
+        """The DAG's viewport now, or a default one if there is no DAG (e.g. nuke -t)."""
+        try:
+            center_x, center_y = nuke.center()
+            zoom = nuke.zoom()
+        except (RuntimeError, ValueError, TypeError):
+            return cls()
+        return cls(center_x, center_y, zoom)
+
+    def __eq__(self, other):
+        return isinstance(other, Viewport) and self._key() == other._key()
+
+    def _key(self):
+        return (self.center_x, self.center_y, self.zoom)
+
+    def priority(self, position):
+        """(0 if on screen else 1, distance in screen pixels) of a node_position(); lower comes first."""
+        x, y, top_level = position
+        dx = (x - self.center_x) * self.zoom
+        dy = (y - self.center_y) * self.zoom
+        visible = top_level and abs(dx) <= VIEW_WIDTH / 2.0 and abs(dy) <= VIEW_HEIGHT / 2.0
+        return (0 if visible else 1, math.hypot(dx, dy))
+
+
+def node_position(node, top_level_positions=None):
+    """(x, y, True) for a top-level node, or its top-level Group's (x, y, False) for one inside a Group.
+
+    top_level_positions ({name: (x, y)}) caches Group positions across calls.
+    """
+    try:
+        full_name = node.fullName()
+        if "." not in full_name:
+            return (node.xpos(), node.ypos(), True)
+        top_level_name = full_name.partition(".")[0]
+        position = None if top_level_positions is None else top_level_positions.get(top_level_name)
+        if position is None:
+            top_level_node = nuke.toNode(top_level_name)
+            position = (top_level_node.xpos(), top_level_node.ypos())
+            if top_level_positions is not None:
+                top_level_positions[top_level_name] = position
+        return position + (False,)
+    except (ValueError, AttributeError):
+        # deleted since it was queued; do it last
+        return (float("inf"), float("inf"), False)
+
+
+class NodeQueue(object):
+    """Nodes in a heap, nearest the viewport first.
+
+    Positions are read once, when a node is queued. If the viewport moves,
+    reprioritise() re-sorts what's left without reading them again.
+    """
+
+    def __init__(self, nodes, viewport=None):
+        super(NodeQueue, self).__init__()
+        self.viewport = Viewport.current() if viewport is None else viewport
+        self._counter = itertools.count()  # keeps equal priorities in queued order
+        top_level_positions = {}
+        self._heap = []
+        for node in nodes:
+            position = node_position(node, top_level_positions)
+            self._heap.append((self.viewport.priority(position), next(self._counter), node, position))
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def pop(self):
+        return heapq.heappop(self._heap)[2]
+
+    def has_visible(self):
+        """True if the next node is on screen."""
+        return bool(self._heap) and self._heap[0][0][0] == 0
+
+    def reprioritise(self, viewport=None):
+        """Re-sort the remaining nodes for viewport (default: the current one) if it has changed."""
+        viewport = Viewport.current() if viewport is None else viewport
+        if viewport == self.viewport:
+            return False
+        self.viewport = viewport
+        self._heap = [
+            (viewport.priority(position), count, node, position)
+            for _, count, node, position in self._heap
+        ]
+        heapq.heapify(self._heap)
+        return True
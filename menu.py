@@ -1,7 +1,11 @@
 import nuke
 import labelmaker
+import labelmaker_config
 import labelmaker_deoverlap
+import labelmaker_lint
 import labelmaker_prefs_dialog
+import labelmaker_profiling
+import labelmaker_relabel
 
 edit_menu = nuke.menu("Nuke").findItem("Edit")
 
@@ -17,9 +21,42 @@ edit_menu.addCommand(
     labelmaker_prefs_dialog.show_prefs_dialog,
     index=project_settings_index + 1,
 )
+edit_menu.addCommand(
+    "Labelmaker Profiling Report...",
+    labelmaker_profiling.show_report,
+    index=project_settings_index + 2,
+)
+edit_menu.addCommand(
+    "Labelmaker Autolabel Stats...",
+    labelmaker_profiling.show_stats,
+    index=project_settings_index + 3,
+)
+edit_menu.addCommand(
+    "Labelmaker Relabel Whole Script",
+    labelmaker_relabel.relabel_script,
+    index=project_settings_index + 4,
+)
+edit_menu.addCommand(
+    "Labelmaker Lint Configs",
+    lambda: labelmaker_lint.show_lint_report(labelmaker.autolabeller_singleton),
+    index=project_settings_index + 5,
+)
 
 node_layout_menu = edit_menu.addMenu("Node Layout")
 node_layout_menu.addCommand(
     "De-overlap All Nodes",
-    lambda: labelmaker_deoverlap.deoverlap_all(undoable=True),
+    lambda: labelmaker_deoverlap.deoverlap_all(undoable=True, incremental=True),
+)
+node_layout_menu.addCommand(
+    "De-overlap All Nodes (Including Groups)",
+    labelmaker_deoverlap.deoverlap_all_groups,
+)
+node_layout_menu.addCommand(
+    "Compact All Nodes",
+    labelmaker_deoverlap.compact_all,
+)
+
+labelmaker_config.config_watcher_singleton.add_listener(
+    labelmaker.autolabeller_singleton.on_config_classes_changed
 )
+labelmaker_config.config_watcher_singleton.start()
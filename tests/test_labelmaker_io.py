@@ -0,0 +1,145 @@
+"""Tests for labelmaker_io's atomic, background saves, run against benchmarks/fake_nuke.
+
+    python -m pytest tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_DIR, "benchmarks"), REPO_DIR]
+
+import fake_nuke  # noqa: E402
+
+fake_nuke.install()
+
+import labelmaker_io  # noqa: E402
+
+
+class WriteAtomicTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "prefs.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replaces_contents_and_keeps_mode(self):
+        with open(self.path, "w") as f:
+            f.write("old")
+        os.chmod(self.path, 0o640)
+        labelmaker_io.write_atomic(self.path, "new")
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "new")
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.directory), ["prefs.json"])
+
+    def test_failed_write_leaves_the_old_file(self):
+        with open(self.path, "w") as f:
+            f.write("old")
+        original_replace = os.replace
+
+        def failing_replace(source, destination):
+            raise OSError("disk full")
+
+        os.replace = failing_replace
+        try:
+            with self.assertRaises(OSError):
+                labelmaker_io.write_atomic(self.path, "new")
+        finally:
+            os.replace = original_replace
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "old")
+        # the temporary file is cleaned up
+        self.assertEqual(os.listdir(self.directory), ["prefs.json"])
+
+    def test_writes_through_symlinks(self):
+        with open(self.path, "w") as f:
+            f.write("old")
+        link_path = os.path.join(self.directory, "link.json")
+        os.symlink(self.path, link_path)
+        labelmaker_io.write_atomic(link_path, "new")
+        self.assertTrue(os.path.islink(link_path))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "new")
+
+
+class AsyncWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.writer = labelmaker_io.AsyncWriter()
+        self.warnings = []
+        self._original_warning = fake_nuke.warning
+        fake_nuke.warning = self.warnings.append
+
+    def tearDown(self):
+        fake_nuke.warning = self._original_warning
+        self.assertTrue(self.writer.flush(5))
+        shutil.rmtree(self.directory)
+
+    def test_coalesces_queued_saves_and_calls_every_callback(self):
+        path = os.path.join(self.directory, "config.json")
+        gate = threading.Event()
+        written = []
+        original_write_atomic = labelmaker_io.write_atomic
+
+        def gated_write_atomic(target, text):
+            gate.wait(5)
+            written.append(text)
+            original_write_atomic(target, text)
+
+        labelmaker_io.write_atomic = gated_write_atomic
+        results = []
+        try:
+            # the first write holds the thread, so the rest queue up behind it
+            self.writer.write_json(path, {"save": 0}, lambda *result: results.append(0))
+            for save in range(1, 5):
+                self.writer.write_json(path, {"save": save}, lambda *result, save=save: results.append(save))
+            gate.set()
+            self.assertTrue(self.writer.flush(5))
+        finally:
+            labelmaker_io.write_atomic = original_write_atomic
+        with open(path) as f:
+            self.assertEqual(json.load(f), {"save": 4})
+        self.assertLessEqual(len(written), 2)
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+
+    def test_failure_is_reported_to_the_callback(self):
+        path = os.path.join(self.directory, "missing", "dir", "prefs.json")
+        open(os.path.join(self.directory, "missing"), "w").close()  # a file, not a directory
+        results = []
+        self.writer.write(path, "{}", lambda *result: results.append(result))
+        self.assertTrue(self.writer.flush(5))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][0], path)
+        self.assertIsInstance(results[0][1], OSError)
+        self.assertEqual(len(self.warnings), 1)
+        self.assertFalse(self.writer.busy)
+
+    def test_unexpected_error_does_not_wedge_flush(self):
+        path = os.path.join(self.directory, "prefs.json")
+        original_write_atomic = labelmaker_io.write_atomic
+
+        def broken_write_atomic(target, text):
+            raise TypeError("not an OSError")
+
+        labelmaker_io.write_atomic = broken_write_atomic
+        results = []
+        try:
+            self.writer.write(path, "{}", lambda *result: results.append(result))
+            self.assertTrue(self.writer.flush(5))
+        finally:
+            labelmaker_io.write_atomic = original_write_atomic
+        self.assertIsInstance(results[0][1], TypeError)
+        # and the writer still works afterwards
+        self.writer.write(path, "{}")
+        self.assertTrue(self.writer.flush(5))
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()